@@ -0,0 +1,12 @@
+"""
+Бенчмарки бота. Запуск из корня репозитория:
+    python -m benchmarks.<имя_модуля>
+
+Для офлайн-запуска подставляются фиктивные настройки,
+если реальный .env не задан.
+"""
+import os
+
+os.environ.setdefault('BOT_TOKEN', '123456:benchmark-token')
+os.environ.setdefault('ADMIN_USERNAMES', 'benchmark_admin')
+os.environ.setdefault('GROUP_CHAT_ID', '-1000000000000')
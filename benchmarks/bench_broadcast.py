@@ -0,0 +1,170 @@
+"""
+Нагрузочный тест рассылок на фейковом Bot API (benchmarks.fake_bot_api).
+
+Для каждого размера базы подписчиков прогоняются сценарии:
+  broadcast — send_broadcast всем подписчикам (с журналом доставки и картинкой по ссылке);
+  group     — серия send_to_group, половина постов с [img:...];
+  restore   — restore_scheduled_posts после "перезапуска": прерванная на середине
+              рассылка, просроченные и будущие посты в группу.
+Выводится скорость (сообщений в секунду) и p50/p99 задержки одной отправки,
+включая ожидание лимитов и повторы после 429.
+
+    python -m benchmarks.bench_broadcast [--sizes 10000,100000,1000000] [--mode sync|async]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+MESSAGE_TEXT = '<b>Нагрузочный тест</b>\nПроверка скорости рассылки 🚀'
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else 0.0
+
+
+def instrument(engine, latencies):
+    """Замер задержки каждой отправки движка рассылки"""
+    def wrap(name):
+        original = getattr(engine, name)
+
+        if asyncio.iscoroutinefunction(original):
+            async def timed_send(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    latencies.append(time.perf_counter() - start)
+        else:
+            def timed_send(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    latencies.append(time.perf_counter() - start)
+
+        setattr(engine, name, timed_send)
+
+    for name in ('_send', '_send_payload') if hasattr(engine, '_send') else ('send', 'send_payload'):
+        wrap(name)
+
+
+def seed_subscribers(db, count, chunk=10000):
+    for offset in range(0, count, chunk):
+        db.add_subscribers([
+            (user_id, f'user{user_id}', 'Имя', None)
+            for user_id in range(offset + 1, min(count, offset + chunk) + 1)
+        ])
+
+
+def report(scenario, size, sent, elapsed, latencies, api):
+    stats = api.stats
+    throttled = sum(count for (_, status), count in stats.items() if status == 429)
+    blocked = sum(count for (_, status), count in stats.items() if status == 403)
+    media_failed = sum(count for (_, status), count in stats.items() if status == 400)
+    print(f"   {scenario:<9} {size:>8}  {sent:>8} сообщ  {elapsed:8.2f} с  {sent / elapsed:8.0f} сообщ/с  "
+          f"p50 {percentile(latencies, 0.5):7.1f} мс  p99 {percentile(latencies, 0.99):8.1f} мс  "
+          f"429: {throttled}  403: {blocked}  400: {media_failed}")
+
+
+def run_size(size, args, api):
+    import telebot
+    from database import Database
+    from utils.rate_control import RateController
+    from utils.scheduler import SchedulerManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        seed_subscribers(db, size)
+
+        bot = telebot.TeleBot('123456:benchmark-token')
+        scheduler = SchedulerManager(bot, db)
+        # Лимиты бенчмарка вместо продакшен-значений из .env
+        scheduler.rate_controller = RateController(global_rate=args.rate, per_chat_rate=args.rate)
+        scheduler.broadcast_engine.rate_controller = scheduler.rate_controller
+        latencies = []
+        instrument(scheduler.broadcast_engine, latencies)
+
+        try:
+            # Рассылка всем подписчикам
+            api.reset_stats()
+            mailing_id = db.add_mailing_post('bench', MESSAGE_TEXT, api.media_url('broadcast.jpg'),
+                                             datetime.now().isoformat())
+            start = time.perf_counter()
+            success_count, fail_count = scheduler.send_broadcast(
+                MESSAGE_TEXT, api.media_url('broadcast.jpg'), 'HTML', mailing_id=mailing_id
+            )
+            report('broadcast', size, success_count + fail_count, time.perf_counter() - start, latencies, api)
+            db.mark_mailing_post_as_sent(mailing_id)
+
+            # Посты в группу
+            api.reset_stats()
+            latencies.clear()
+            start = time.perf_counter()
+            for number in range(args.group_posts):
+                image_url = api.media_url(f'group-{number % 10}.jpg') if number % 2 else None
+                scheduler.send_to_group(f'{MESSAGE_TEXT} #{number}', image_url, 'HTML')
+            report('group', size, args.group_posts, time.perf_counter() - start, latencies, api)
+
+            # Восстановление после перезапуска: рассылка прервана на середине
+            db.add_subscribers([(user_id, None, None, None) for user_id in range(1, size + 1)])
+            past = (datetime.now() - timedelta(minutes=5)).isoformat()
+            future = (datetime.now() + timedelta(days=1)).isoformat()
+            mailing_id = db.add_mailing_post('bench', MESSAGE_TEXT, None, past)
+            db.record_deliveries(mailing_id, [(user_id, 'sent') for user_id in range(1, size // 2 + 1)])
+            for number in range(args.restore_posts):
+                if number % 2:
+                    db.add_group_post('bench', f'{MESSAGE_TEXT} #{number}', None, past)
+                else:
+                    # Будущие посты лежат в хранилище задач и при запуске не читаются
+                    post_id = db.add_group_post('bench', f'{MESSAGE_TEXT} #{number}', None, future)
+                    scheduler.schedule_group_post(post_id, None, None, datetime.fromisoformat(future))
+
+            api.reset_stats()
+            latencies.clear()
+            start = time.perf_counter()
+            scheduler.restore_scheduled_posts()
+            scheduler.catchup.wait()
+            report('restore', size, len(latencies), time.perf_counter() - start, latencies, api)
+        finally:
+            scheduler.shutdown()
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='размеры базы подписчиков через запятую')
+    parser.add_argument('--mode', choices=('sync', 'async'), default=os.getenv('DELIVERY_MODE', 'sync'))
+    parser.add_argument('--rate', type=float, default=3000, help='лимит скорости бота в бенчмарке, сообщ/с')
+    parser.add_argument('--api-rate-limit', type=float, default=0, help='лимит фейкового API (0 — равен --rate)')
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--blocked-ratio', type=float, default=0.05)
+    parser.add_argument('--media-fail-ratio', type=float, default=0.0)
+    parser.add_argument('--group-posts', type=int, default=200)
+    parser.add_argument('--restore-posts', type=int, default=200)
+    parser.add_argument('--verbose', action='store_true', help='показывать логи бота')
+    args = parser.parse_args()
+
+    # Режим доставки читается из config при импорте модулей бота
+    os.environ['DELIVERY_MODE'] = args.mode
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    api = FakeBotAPI(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                     rate_limit=args.api_rate_limit or args.rate, blocked_ratio=args.blocked_ratio,
+                     media_fail_ratio=args.media_fail_ratio)
+    with api:
+        print(f"📊 Режим {args.mode}, лимит {args.rate:.0f} сообщ/с, задержка API {args.latency_ms} мс "
+              f"(±{args.jitter_ms}), заблокировали бота {args.blocked_ratio:.0%}:")
+        for size in (int(value) for value in args.sizes.split(',')):
+            run_size(size, args, api)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Микробенчмарки Database на объемах продакшена.
+
+Во временный файл SQLite засеваются синтетические подписчики и история постов,
+после чего замеряется каждый метод хранилища. Результаты дописываются в
+benchmarks/results/bench_database.jsonl с хешем коммита и сравниваются с
+последним прогоном с теми же параметрами — регрессии видны до продакшена.
+
+    python -m benchmarks.bench_database [--subscribers N] [--posts N] [--fail-on-regression]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), 'results', 'bench_database.jsonl')
+
+
+def git_revision():
+    """Текущий коммит и признак незакоммиченных изменений"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def seed(db, subscribers, posts, pending, chunk=50000):
+    """Синтетические данные: подписчики, отправленная история и ожидающие посты"""
+    for offset in range(0, subscribers, chunk):
+        db.add_subscribers([
+            (user_id, f'user{user_id}', 'Имя', 'Фамилия')
+            for user_id in range(offset + 1, min(subscribers, offset + chunk) + 1)
+        ])
+
+    now = datetime.now()
+    conn = db.get_connection()
+    for table in ('group_posts', 'mailing_posts'):
+        rows = [
+            (f'author{number % 20}', f'Пост {number} ' + 'текст ' * 40, None,
+             (now - timedelta(minutes=posts - number)).isoformat(), True)
+            for number in range(posts)
+        ]
+        rows += [
+            (f'author{number % 20}', f'Ожидает {number}', None,
+             (now - timedelta(seconds=number) if number % 2 else now + timedelta(days=1)).isoformat(), False)
+            for number in range(pending)
+        ]
+        with conn:
+            conn.executemany(f'''
+                INSERT INTO {table} (author_username, message_text, image_url, scheduled_time, sent)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+
+
+def measure(func, repeat):
+    """Медиана времени одного вызова, секунды"""
+    samples = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        func(index)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        start = time.perf_counter()
+        seed(db, args.subscribers, args.posts, args.pending)
+        print(f"🌱 Засеяно за {time.perf_counter() - start:.1f} с: {args.subscribers} подписчиков, "
+              f"{args.posts} + {args.pending} постов в каждой таблице")
+
+        conn = db.get_connection()
+        pending_group = [row[0] for row in conn.execute('SELECT id FROM group_posts WHERE sent = FALSE')]
+        pending_mailing = [row[0] for row in conn.execute('SELECT id FROM mailing_posts WHERE sent = FALSE')]
+        marks = min(args.calls, len(pending_group), len(pending_mailing))
+        new_user = args.subscribers
+
+        benchmarks = [
+            ('add_subscriber', args.calls,
+             lambda i: db.add_subscriber(new_user + i + 1, f'new{i}', 'Имя', None)),
+            ('add_subscriber (повтор /start)', args.calls,
+             lambda i: db.add_subscriber(i + 1, f'user{i + 1}', 'Имя', 'Фамилия')),
+            ('get_all_subscribers', args.scans, lambda i: db.get_all_subscribers()),
+            ('iter_subscribers', args.scans, lambda i: sum(1 for _ in db.iter_subscribers())),
+            ('get_pending_group_posts', args.calls, lambda i: db.get_pending_group_posts()),
+            ('get_pending_mailing_posts', args.calls, lambda i: db.get_pending_mailing_posts()),
+            ('get_scheduled_group_posts', args.calls, lambda i: db.get_scheduled_group_posts()),
+            ('get_all_group_posts', args.scans, lambda i: db.get_all_group_posts()),
+            ('get_all_mailing_posts', args.scans, lambda i: db.get_all_mailing_posts()),
+            ('mark_group_post_as_sent', marks, lambda i: db.mark_group_post_as_sent(pending_group[i])),
+            ('mark_mailing_post_as_sent', marks, lambda i: db.mark_mailing_post_as_sent(pending_mailing[i])),
+        ]
+
+        results = {}
+        for name, repeat, func in benchmarks:
+            if repeat <= 0:
+                continue
+            results[name] = measure(func, repeat)
+        db.close()
+    return results
+
+
+def load_previous(params):
+    """Последний сохраненный прогон с теми же параметрами"""
+    if not os.path.exists(HISTORY_PATH):
+        return None
+    previous = None
+    with open(HISTORY_PATH, encoding='utf-8') as history:
+        for line in history:
+            if line.strip():
+                record = json.loads(line)
+                if record.get('params') == params:
+                    previous = record
+    return previous
+
+
+def save(record):
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    with open(HISTORY_PATH, 'a', encoding='utf-8') as history:
+        history.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f'{seconds:8.2f} с '
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:8.2f} мс'
+    return f'{seconds * 1e6:8.1f} мкс'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=1000000)
+    parser.add_argument('--posts', type=int, default=200000, help='отправленных постов в каждой таблице')
+    parser.add_argument('--pending', type=int, default=2000, help='ожидающих постов в каждой таблице')
+    parser.add_argument('--calls', type=int, default=500, help='повторов для точечных операций')
+    parser.add_argument('--scans', type=int, default=3, help='повторов для полных выборок')
+    parser.add_argument('--threshold', type=float, default=0.2, help='замедление, считающееся регрессией')
+    parser.add_argument('--no-save', action='store_true', help='не записывать результат в историю')
+    parser.add_argument('--fail-on-regression', action='store_true', help='код выхода 1 при регрессии')
+    args = parser.parse_args()
+
+    params = {name: getattr(args, name) for name in ('subscribers', 'posts', 'pending', 'calls', 'scans')}
+    results = run(args)
+
+    commit, dirty = git_revision()
+    previous = load_previous(params)
+    if previous:
+        print(f"📊 Сравнение с {previous['commit']} от {previous['timestamp']}:")
+    else:
+        print("📊 Результаты (предыдущих прогонов с такими параметрами нет):")
+
+    regressions = []
+    for name, seconds in results.items():
+        line = f"   {name:<32} {format_time(seconds)}"
+        before = (previous or {}).get('results', {}).get(name)
+        if before:
+            change = seconds / before - 1
+            mark = '⚠️' if change > args.threshold else '  '
+            line += f"   {format_time(before)} → {change:+7.1%} {mark}"
+            if change > args.threshold:
+                regressions.append(name)
+        print(line)
+
+    if not args.no_save:
+        save({
+            'commit': commit + ('-dirty' if dirty else ''),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'params': params,
+            'results': results,
+        })
+        print(f"💾 Записано в {os.path.relpath(HISTORY_PATH)}")
+
+    if regressions:
+        print(f"⚠️ Регрессии больше {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
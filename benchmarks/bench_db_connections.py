@@ -0,0 +1,94 @@
+"""
+Сравнение старой схемы "соединение на каждый вызов" с постоянными
+соединениями Database (WAL, synchronous=NORMAL).
+
+    python -m benchmarks.bench_db_connections [--inserts N] [--reads N]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+
+
+def legacy_add_subscriber(db_path, user_id):
+    """Вставка так, как это делалось до пула соединений"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO subscribers
+        (user_id, username, first_name, last_name)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, f'user{user_id}', 'Имя', 'Фамилия'))
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_pending_group_posts(db_path):
+    """Чтение так, как это делалось до пула соединений"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, author_username, message_text, image_url, scheduled_time
+        FROM group_posts
+        WHERE sent = FALSE AND scheduled_time <= datetime('now')
+    ''')
+    posts = cursor.fetchall()
+    conn.close()
+    return posts
+
+
+def seed_posts(db, count):
+    past = (datetime.now() - timedelta(days=1)).isoformat()
+    for i in range(count):
+        db.add_group_post('author', f'Пост {i}', None, past)
+
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<32} {elapsed:8.3f} с  ({count / elapsed:10.0f} оп/с)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--inserts', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        pooled_path = os.path.join(tmp, 'pooled.db')
+
+        # Схема создается одинаково, легаси-файл остается в режиме journal_mode=DELETE
+        legacy_db = Database(legacy_path)
+        seed_posts(legacy_db, args.posts)
+        legacy_db.get_connection().execute('PRAGMA journal_mode=DELETE')
+        legacy_db.close()
+
+        pooled_db = Database(pooled_path)
+        seed_posts(pooled_db, args.posts)
+
+        print(f"📊 Вставки подписчиков ({args.inserts}):")
+        before_insert = timed("до: connect на вызов", lambda i: legacy_add_subscriber(legacy_path, i), args.inserts)
+        after_insert = timed("после: постоянное соединение",
+                             lambda i: pooled_db.add_subscriber(i, f'user{i}', 'Имя', 'Фамилия'), args.inserts)
+
+        print(f"📊 Чтения get_pending_group_posts ({args.reads}):")
+        before_read = timed("до: connect на вызов", lambda i: legacy_get_pending_group_posts(legacy_path), args.reads)
+        after_read = timed("после: постоянное соединение", lambda i: pooled_db.get_pending_group_posts(), args.reads)
+
+        pooled_db.close()
+
+    print(f"\n🚀 Ускорение: вставки x{before_insert / after_insert:.1f}, чтения x{before_read / after_read:.1f}")
+
+
+if __name__ == '__main__':
+    main()
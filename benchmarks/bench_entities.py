@@ -0,0 +1,93 @@
+"""
+Сравнение старой конвертации entities (пересборка строки на каждую entity)
+с однопроходным render_entities на длинных постах с сотнями entities.
+
+    python -m benchmarks.bench_entities [--entities 100,500,1000] [--length 20000]
+"""
+import argparse
+import html as html_escape
+import random
+import time
+
+from telebot.types import MessageEntity
+
+from utils.helpers import render_entities
+
+LEGACY_TAGS = {
+    'bold': 'b', 'italic': 'i', 'underline': 'u', 'strikethrough': 's',
+    'code': 'code', 'pre': 'pre', 'spoiler': 'tg-spoiler',
+}
+
+
+def legacy_convert_entities_to_html(text, entities):
+    """Конвертация так, как это делалось до render_entities"""
+    if not entities:
+        return html_escape.escape(text)
+
+    result = text
+    for entity in sorted(entities, key=lambda x: x.offset, reverse=True):
+        start = entity.offset
+        end = entity.offset + entity.length
+        if start >= len(result) or end > len(result):
+            continue
+        entity_text = result[start:end]
+        if entity.type == 'text_link':
+            replacement = f'<a href="{entity.url}">{html_escape.escape(entity_text)}</a>'
+        elif entity.type in LEGACY_TAGS:
+            tag = LEGACY_TAGS[entity.type]
+            replacement = f'<{tag}>{html_escape.escape(entity_text)}</{tag}>'
+        else:
+            replacement = html_escape.escape(entity_text)
+        result = result[:start] + replacement + result[end:]
+    return result
+
+
+def make_post(length, count, rng):
+    """Текст с эмодзи и спецсимволами HTML и набор вложенных entities"""
+    words = ['рассылка', 'новости', '<важно>', 'скидки & акции', '🚀', 'подписчикам', 'https://example.com']
+    text = ''
+    while len(text) < length:
+        text += rng.choice(words) + ' '
+    text = text[:length]
+
+    units = len(text.encode('utf-16-le')) // 2
+    types = ['bold', 'italic', 'underline', 'strikethrough', 'spoiler', 'code', 'text_link']
+    step = max(1, units // count)
+    entities = []
+    for number in range(count):
+        offset = min(units - 2, number * step)
+        entity_type = types[number % len(types)]
+        entities.append(MessageEntity(entity_type, offset, max(1, step - 1),
+                                      url='https://example.com/?a=1&b=2' if entity_type == 'text_link' else None))
+        # Каждая пятая entity содержит вложенную
+        if number % 5 == 0 and step > 4:
+            entities.append(MessageEntity('italic', offset + 1, step // 2))
+    return text, entities
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entities', default='100,500,1000', help='количество entities через запятую')
+    parser.add_argument('--length', type=int, default=20000, help='длина текста в символах')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"📊 Текст {args.length} символов:")
+    for count in (int(value) for value in args.entities.split(',')):
+        text, entities = make_post(args.length, count, rng)
+        before = timed(lambda: legacy_convert_entities_to_html(text, entities), args.repeat)
+        after = timed(lambda: render_entities(text, entities), args.repeat)
+        print(f"   {len(entities):>5} entities:  до {before * 1e3:8.2f} мс   после {after * 1e3:8.2f} мс   "
+              f"x{before / after:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Стоимость построения списка /scheduled: превью без кэша
+(регулярное выражение на каждую строку) против LRU-кэша по id поста.
+
+    python -m benchmarks.bench_previews [--posts N] [--repeat N]
+"""
+import argparse
+import time
+
+from utils.message_parser import PreviewCache, make_preview
+
+POST_TEXT = '<b>Анонс</b> нового выпуска: <i>подробности</i> по ссылке <a href="https://example.com">тут</a>. ' * 10
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    posts = [(post_id, f'{POST_TEXT} #{post_id}') for post_id in range(args.posts)]
+    cache = PreviewCache(max_entries=args.posts * 2)
+
+    before = timed(lambda: [make_preview(text, 40) for _, text in posts], args.repeat)
+    after = timed(lambda: [cache.get('group', post_id, text, 40) for post_id, text in posts], args.repeat)
+
+    print(f"📊 Превью для {args.posts} постов:")
+    print(f"   без кэша     {before * 1e3:8.3f} мс")
+    print(f"   LRU-кэш      {after * 1e3:8.3f} мс  (x{before / after:.1f}, попаданий {cache.hits}, промахов {cache.misses})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Нагрузочный тест приема обновлений: webhook против long polling на localhost.
+
+Синтетические обновления появляются с заданной скоростью. В режиме webhook их
+отправляют клиенты (как Telegram, до --connections соединений), в режиме polling
+их отдает фейковый Bot API через getUpdates. Сеть до Telegram имитируется задержкой
+--rtt-ms: polling платит полный круг на каждую пачку, webhook — путь в одну сторону.
+Задержка считается от появления обновления до завершения обработчика.
+
+    python -m benchmarks.bench_webhook [--count N] [--rate N] [--handler-ms N] [--rtt-ms N]
+"""
+import argparse
+import http.client
+import json
+import queue
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import telebot
+from telebot import apihelper
+
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+TOKEN = '123456:benchmark-token'
+SECRET = 'benchmark-secret'
+
+
+def make_update(update_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': 1000 + update_id % 500, 'type': 'private'},
+            'from': {'id': 1000 + update_id % 500, 'is_bot': False, 'first_name': 'Bench'},
+            'text': f'/ping {update_id}',
+        },
+    }
+
+
+class Recorder:
+    """Время появления обновлений и задержка до конца обработки"""
+
+    def __init__(self, count):
+        self.count = count
+        self.produced_at = {}
+        self.latencies = []
+        self.finished_at = None
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def produced(self, update_id, moment):
+        self.produced_at[update_id] = moment
+
+    def handled(self, update_id):
+        now = time.perf_counter()
+        with self.lock:
+            self.latencies.append(now - self.produced_at[update_id])
+            if len(self.latencies) >= self.count:
+                self.finished_at = now
+                self.done.set()
+
+
+def make_bot(recorder, handler_ms, **kwargs):
+    bot = telebot.TeleBot(TOKEN, **kwargs)
+
+    @bot.message_handler(func=lambda message: True)
+    def handle(message):
+        time.sleep(handler_ms / 1000)
+        recorder.handled(message.message_id)
+
+    return bot
+
+
+def schedule(count, rate):
+    start = time.perf_counter() + 0.2
+    return start, [(update_id, start + (update_id - 1) / rate) for update_id in range(1, count + 1)]
+
+
+def run_webhook(args):
+    recorder = Recorder(args.count)
+    bot = make_bot(recorder, args.handler_ms, threaded=False)
+    server = WebhookServer(bot, url='', listen='127.0.0.1', port=0, path='/webhook', secret_token=SECRET,
+                           workers=args.workers, queue_size=args.count)
+    server.start()
+
+    start, plan = schedule(args.count, args.rate)
+    tasks = queue.Queue()
+    for item in plan:
+        tasks.put(item)
+    statuses = []
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', server.port)
+        while True:
+            try:
+                update_id, due = tasks.get_nowait()
+            except queue.Empty:
+                break
+            recorder.produced(update_id, due)
+            time.sleep(max(0.0, due - time.perf_counter()) + args.rtt_ms / 2000)
+            body = json.dumps(make_update(update_id))
+            conn.request('POST', '/webhook', body, {'Content-Type': 'application/json', SECRET_HEADER: SECRET})
+            response = conn.getresponse()
+            response.read()
+            statuses.append(response.status)
+        conn.close()
+
+    clients = [threading.Thread(target=client) for _ in range(args.connections)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    recorder.done.wait(args.timeout)
+    server.stop()
+
+    rejected = sum(1 for status in statuses if status != 200)
+    return report('webhook', recorder, start, f'воркеров {args.workers}, отказов {rejected}')
+
+
+class FakeUpdatesAPI:
+    """Фейковый Bot API с long polling getUpdates"""
+
+    def __init__(self, rtt_ms):
+        self.rtt = rtt_ms / 1000
+        self.pending = []
+        self.condition = threading.Condition()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def push(self, update):
+        with self.condition:
+            self.pending.append(update)
+            self.condition.notify_all()
+
+    def get_updates(self, offset, limit, timeout):
+        time.sleep(self.rtt / 2)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.pending = [update for update in self.pending if update['update_id'] >= offset]
+            while not self.pending and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            batch = self.pending[:limit]
+        time.sleep(self.rtt / 2)
+        return batch
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                method = self.path.rsplit('/', 1)[-1].split('?')[0]
+                params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    params.update(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+
+                if method == 'getUpdates':
+                    result = api.get_updates(int(params.get('offset', 0)), int(params.get('limit', 100)),
+                                             float(params.get('timeout', 0)))
+                elif method == 'getMe':
+                    result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+                else:
+                    result = True
+
+                body = json.dumps({'ok': True, 'result': result}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def run_polling(args, threads):
+    recorder = Recorder(args.count)
+    api = FakeUpdatesAPI(args.rtt_ms)
+    original_url = apihelper.API_URL
+    apihelper.API_URL = api.url + '/bot{0}/{1}'
+    bot = make_bot(recorder, args.handler_ms, threaded=True, num_threads=threads)
+
+    poller = threading.Thread(
+        target=bot.polling, kwargs={'non_stop': True, 'timeout': 10, 'long_polling_timeout': 1}, daemon=True
+    )
+    poller.start()
+
+    start, plan = schedule(args.count, args.rate)
+    for update_id, due in plan:
+        time.sleep(max(0.0, due - time.perf_counter()))
+        recorder.produced(update_id, due)
+        api.push(make_update(update_id))
+    recorder.done.wait(args.timeout)
+
+    bot.stop_bot()
+    poller.join(5)
+    apihelper.API_URL = original_url
+    api.httpd.shutdown()
+    return report('polling', recorder, start, f'потоков {threads}')
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000 if ordered else float('nan')
+
+
+def report(label, recorder, start, details):
+    handled = len(recorder.latencies)
+    elapsed = (recorder.finished_at or time.perf_counter()) - start
+    print(f"   {label:<8} {handled / elapsed:8.0f} обн/с   "
+          f"p50 {percentile(recorder.latencies, 0.5):7.1f} мс   "
+          f"p99 {percentile(recorder.latencies, 0.99):7.1f} мс   "
+          f"обработано {handled}/{recorder.count} ({details})")
+    return handled / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=3000, help='число обновлений')
+    parser.add_argument('--rate', type=float, default=1000, help='скорость появления обновлений, обн/с')
+    parser.add_argument('--handler-ms', type=float, default=5, help='время работы обработчика')
+    parser.add_argument('--rtt-ms', type=float, default=50, help='круговая задержка до Telegram')
+    parser.add_argument('--workers', type=int, default=16, help='воркеров webhook')
+    parser.add_argument('--connections', type=int, default=40, help='соединений Telegram -> webhook')
+    parser.add_argument('--polling-threads', type=int, default=2, help='потоков TeleBot при polling')
+    parser.add_argument('--timeout', type=float, default=120, help='максимальное время одного прогона')
+    args = parser.parse_args()
+
+    print(f"📊 {args.count} обновлений, {args.rate:.0f} обн/с, обработчик {args.handler_ms} мс, RTT {args.rtt_ms} мс:")
+    polling_rate = run_polling(args, args.polling_threads)
+    if args.polling_threads != args.workers:
+        run_polling(args, args.workers)
+    webhook_rate = run_webhook(args)
+
+    print(f"\n🚀 Webhook / polling ({args.polling_threads} потока): x{webhook_rate / polling_rate:.1f}")
+
+
+if __name__ == '__main__':
+    main()
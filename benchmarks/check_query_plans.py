@@ -0,0 +1,65 @@
+"""
+Проверка, что горячие запросы к постам используют индексы
+(EXPLAIN QUERY PLAN не должен содержать полного сканирования таблицы).
+
+    python -m benchmarks.check_query_plans
+"""
+import os
+import sys
+import tempfile
+
+from database import Database
+
+# (описание, вызов метода Database, ожидаемый индекс) — проверяются запросы,
+# которые метод действительно выполняет, а не их копии
+HOT_QUERIES = [
+    ("get_pending_group_posts", lambda db: db.get_pending_group_posts(), 'idx_group_posts_sent_time'),
+    ("get_pending_mailing_posts", lambda db: db.get_pending_mailing_posts(), 'idx_mailing_posts_sent_time'),
+    ("get_scheduled_group_posts", lambda db: db.get_scheduled_group_posts(), 'idx_group_posts_sent_time'),
+    ("get_scheduled_mailing_posts", lambda db: db.get_scheduled_mailing_posts(), 'idx_mailing_posts_sent_time'),
+    ("get_scheduled_group_posts(author)", lambda db: db.get_scheduled_group_posts('author'),
+     'idx_group_posts_author'),
+]
+
+
+def capture_queries(conn, call):
+    """SELECT-запросы, выполненные call(), с подставленными параметрами"""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')]
+
+
+def explain(conn, query):
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {query}').fetchall()
+    return [row[-1] for row in rows]
+
+
+def main():
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'plans.db'))
+        conn = db.get_connection()
+
+        for name, call, index in HOT_QUERIES:
+            queries = capture_queries(conn, lambda: call(db))
+            plan = [step for query in queries for step in explain(conn, query)]
+            ok = bool(queries) and any(index in step for step in plan) and not any(
+                step.startswith('SCAN') and 'INDEX' not in step for step in plan
+            )
+            failed += not ok
+            print(f"{'✅' if ok else '❌'} {name}: {' | '.join(plan) or 'запрос не выполнен'}")
+
+        db.close()
+
+    if failed:
+        print(f"\n❌ Запросов без ожидаемого индекса: {failed}")
+        sys.exit(1)
+    print("\n🎉 Все горячие запросы используют индексы")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Отвечает на sendMessage/sendPhoto и остальные методы как настоящий API и умеет
+имитировать задержку сети, 429 Too Many Requests с retry_after, пользователей,
+заблокировавших бота, и ошибки загрузки изображений по ссылке. По адресу
+/media/<имя> отдает тестовую картинку для [img:...].
+
+В коде:
+    with FakeBotAPI(latency_ms=30, rate_limit=30) as api:
+        ...  # telebot.apihelper.API_URL уже указывает на api
+
+Отдельным процессом:
+    python -m benchmarks.fake_bot_api --port 8081 --latency-ms 30 --rate-limit 30
+    # затем в боте: telebot.apihelper.API_URL = 'http://127.0.0.1:8081/bot{0}/{1}'
+"""
+import argparse
+import json
+import random
+import re
+import socket
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import apihelper
+
+BLOCKED_DESCRIPTION = 'Forbidden: bot was blocked by the user'
+MEDIA_FAILED_DESCRIPTION = 'Bad Request: wrong file identifier/HTTP URL specified'
+
+MULTIPART_FIELD = re.compile(rb'name="([^"]+)"(?:; filename="[^"]*")?\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', re.S)
+
+
+class FakeBotAPI:
+    """HTTP-сервер, совместимый с telebot.apihelper.API_URL"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0.0, jitter_ms=0.0, rate_limit=0.0,
+                 retry_after=1, blocked_ratio=0.0, media_fail_ratio=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.blocked_ratio = blocked_ratio
+        self.media_fail_ratio = media_fail_ratio
+        self.random = random.Random(seed)
+        self.media = bytes(self.random.getrandbits(8) for _ in range(50 * 1024))
+
+        self.lock = threading.Lock()
+        self.tokens = max(1.0, rate_limit)
+        self.updated_at = time.monotonic()
+        self.message_id = 0
+        self.stats = Counter()
+        self._saved_urls = None
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        """Шаблон для telebot.apihelper.API_URL"""
+        return self.url + '/bot{0}/{1}'
+
+    def media_url(self, name='image.jpg'):
+        return f'{self.url}/media/{name}'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name='fake-bot-api', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def install(self):
+        """Перенаправление TeleBot и AsyncTeleBot на этот сервер"""
+        self._saved_urls = [apihelper.API_URL]
+        apihelper.API_URL = self.api_url
+        try:
+            from telebot import asyncio_helper
+            self._saved_urls.append(asyncio_helper.API_URL)
+            asyncio_helper.API_URL = self.api_url
+        except ImportError:
+            pass
+
+    def uninstall(self):
+        if self._saved_urls is None:
+            return
+        apihelper.API_URL = self._saved_urls[0]
+        if len(self._saved_urls) > 1:
+            from telebot import asyncio_helper
+            asyncio_helper.API_URL = self._saved_urls[1]
+        self._saved_urls = None
+
+    def __enter__(self):
+        self.start()
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
+    def is_blocked(self, chat_id):
+        """Детерминированная доля "заблокировавших" среди личных чатов"""
+        if chat_id <= 0 or not self.blocked_ratio:
+            return False
+        return (chat_id * 2654435761) % 10000 < self.blocked_ratio * 10000
+
+    def _take_token(self, chat_id):
+        """Общий лимит бота на личные чаты; False — пора отвечать 429"""
+        if not self.rate_limit or chat_id < 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate_limit, self.tokens + (now - self.updated_at) * self.rate_limit)
+            self.updated_at = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def handle(self, method, params, uploaded):
+        """Ответ API: (http_status, payload)"""
+        if method == 'getMe':
+            return 200, {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+        if method not in ('sendMessage', 'sendPhoto'):
+            return 200, True
+
+        chat_id = int(params.get('chat_id', 0))
+        if not self._take_token(chat_id):
+            return 429, {'description': f'Too Many Requests: retry after {self.retry_after}',
+                         'parameters': {'retry_after': self.retry_after}}
+        if self.is_blocked(chat_id):
+            return 403, {'description': BLOCKED_DESCRIPTION}
+
+        with self.lock:
+            self.message_id += 1
+            message = {
+                'message_id': self.message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+            }
+            media_failed = (method == 'sendPhoto' and not uploaded and self.media_fail_ratio
+                            and str(params.get('photo', '')).startswith('http')
+                            and self.random.random() < self.media_fail_ratio)
+        if media_failed:
+            return 400, {'description': MEDIA_FAILED_DESCRIPTION}
+
+        if method == 'sendPhoto':
+            file_id = f'fake-file-{self.message_id}' if uploaded else params.get('photo')
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 600}]
+            message['caption'] = params.get('caption')
+        else:
+            message['text'] = params.get('text')
+        return 200, message
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Заголовки и тело уходят разными write(): без TCP_NODELAY
+                # Nagle + delayed ACK добавляют ~40 мс к каждому ответу
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                if self.path.startswith('/media/'):
+                    return self._send(200, api.media, 'image/jpeg')
+                self._api()
+
+            def do_POST(self):
+                self._api()
+
+            def _api(self):
+                parts = urllib.parse.urlsplit(self.path)
+                method = parts.path.rsplit('/', 1)[-1]
+                params = dict(urllib.parse.parse_qsl(parts.query))
+                uploaded = False
+
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('multipart/form-data'):
+                    for name, value in MULTIPART_FIELD.findall(body):
+                        name = name.decode()
+                        if name == 'photo':
+                            uploaded = True
+                        else:
+                            params[name] = value.decode('utf-8', 'replace')
+                elif content_type.startswith('application/json'):
+                    params.update(json.loads(body or b'{}'))
+                elif body:
+                    params.update(urllib.parse.parse_qsl(body.decode()))
+
+                delay = api.latency + (api.random.uniform(0, api.jitter) if api.jitter else 0.0)
+                if delay:
+                    time.sleep(delay)
+
+                status, result = api.handle(method, params, uploaded)
+                with api.lock:
+                    api.stats[(method, status)] += 1
+
+                if status == 200:
+                    payload = {'ok': True, 'result': result}
+                else:
+                    payload = {'ok': False, 'error_code': status, **result}
+                self._send(status, json.dumps(payload).encode(), 'application/json')
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Фейковый Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--rate-limit', type=float, default=30, help='сообщений в секунду, 0 — без лимита')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--blocked-ratio', type=float, default=0.05)
+    parser.add_argument('--media-fail-ratio', type=float, default=0.0)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.host, args.port, args.latency_ms, args.jitter_ms, args.rate_limit,
+                     args.retry_after, args.blocked_ratio, args.media_fail_ratio)
+    print(f"🌐 Фейковый Bot API: {api.api_url}")
+    try:
+        api.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.httpd.server_close()
+        for (method, status), count in sorted(api.stats.items()):
+            print(f"   {method:<12} {status}: {count}")
+
+
+if __name__ == '__main__':
+    main()
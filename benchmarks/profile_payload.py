@@ -0,0 +1,99 @@
+"""
+CPU-профиль отправки рассылки: bot.send_message на каждого получателя
+против заранее сериализованного BroadcastPayload.
+
+Сеть заменена адаптером requests с готовым ответом, поэтому в профиль попадает
+только работа бота: сборка параметров, кодирование запроса и разбор ответа.
+
+    python -m benchmarks.profile_payload [--recipients 100000] [--output DIR]
+"""
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+
+import requests
+import telebot
+from telebot import apihelper
+
+from utils.payload import BroadcastPayload
+
+TOKEN = '123456:benchmark-token'
+MESSAGE_TEXT = ('<b>Большая рассылка</b> 🚀\n' + 'Новости проекта, подробности по ссылке https://example.com. ' * 8)[:1000]
+
+
+class CannedAdapter(requests.adapters.BaseAdapter):
+    """Транспорт requests, который сразу возвращает успешный ответ Bot API"""
+
+    def __init__(self):
+        super().__init__()
+        self.content = json.dumps({'ok': True, 'result': {
+            'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': MESSAGE_TEXT,
+        }}).encode()
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.content
+        response.headers['Content-Type'] = 'application/json'
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def profile(label, func, count, output):
+    profiler = cProfile.Profile()
+    cpu_start = time.process_time()
+    profiler.enable()
+    for chat_id in range(1, count + 1):
+        func(chat_id)
+    profiler.disable()
+    cpu = time.process_time() - cpu_start
+
+    stats = pstats.Stats(profiler)
+    if output:
+        path = os.path.join(output, f'{label}.prof')
+        stats.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('tottime').print_stats(8)
+    print(f"   {label:<8} CPU {cpu:7.2f} с  ({cpu / count * 1e6:6.1f} мкс на отправку, "
+          f"{stats.total_calls / count:6.0f} вызовов функций на отправку)")
+    return cpu, summary.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipients', type=int, default=100000)
+    parser.add_argument('--output', default=None, help='каталог для .prof файлов (snakeviz, pstats)')
+    parser.add_argument('--top', action='store_true', help='показать самые дорогие функции')
+    args = parser.parse_args()
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    session = requests.Session()
+    session.mount('https://', CannedAdapter())
+    session.mount('http://', CannedAdapter())
+    apihelper.session = session
+    apihelper.API_URL = None
+
+    bot = telebot.TeleBot(TOKEN)
+    payload = BroadcastPayload.for_bot(bot, MESSAGE_TEXT, None, 'HTML')
+
+    print(f"📊 CPU-профиль рассылки на {args.recipients} получателей:")
+    before, before_top = profile('telebot', lambda chat_id: bot.send_message(chat_id, MESSAGE_TEXT, parse_mode='HTML'),
+                                 args.recipients, args.output)
+    after, after_top = profile('payload', lambda chat_id: payload.send(TOKEN, chat_id), args.recipients, args.output)
+    print(f"\n🚀 CPU на отправку меньше в {before / after:.1f} раза")
+
+    if args.top:
+        print("\nДо:\n" + before_top + "\nПосле:\n" + after_top)
+
+
+if __name__ == '__main__':
+    main()
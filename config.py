@@ -1,4 +1,6 @@
 import os
+import re
+import secrets
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,6 +11,77 @@ ADMIN_USERNAMES = [username.strip() for username in os.getenv('ADMIN_USERNAMES',
 GROUP_CHAT_ID = os.getenv('GROUP_CHAT_ID')
 GROUP_LINK = os.getenv('GROUP_LINK')
 
+# База данных
+DB_PATH = os.getenv('DB_PATH', 'bot.db')
+DB_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT', '5000'))  # мс ожидания блокировки
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(64 * 1024 * 1024)))  # байт
+SUBSCRIBERS_CHUNK_SIZE = int(os.getenv('SUBSCRIBERS_CHUNK_SIZE', '1000'))  # подписчиков на страницу при рассылке
+SUBSCRIBER_FLUSH_SIZE = int(os.getenv('SUBSCRIBER_FLUSH_SIZE', '200'))  # подписчиков в одной пачке записи
+SUBSCRIBER_FLUSH_INTERVAL = float(os.getenv('SUBSCRIBER_FLUSH_INTERVAL', '1'))  # секунд между сбросами буфера
+COUNTERS_CACHE_TTL = float(os.getenv('COUNTERS_CACHE_TTL', '5'))  # секунд кэширования счетчиков в памяти
+PREVIEW_CACHE_SIZE = int(os.getenv('PREVIEW_CACHE_SIZE', '1024'))  # превью постов в LRU-кэше
+
+# Черновики постов и рассылок, ожидающие нажатия кнопки
+DRAFT_TTL = int(os.getenv('DRAFT_TTL', '86400'))  # секунд до удаления брошенного черновика
+DRAFT_MAX_ENTRIES = int(os.getenv('DRAFT_MAX_ENTRIES', '1000'))  # черновиков в памяти
+DRAFT_MAX_BYTES = int(os.getenv('DRAFT_MAX_BYTES', str(4 * 1024 * 1024)))  # байт черновиков в памяти
+DRAFTS_PERSIST = os.getenv('DRAFTS_PERSIST', 'true').strip().lower() in ('1', 'true', 'yes')  # копия в SQLite
+
+# Настройки рассылки
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', '8'))
+BROADCAST_GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE', '30'))  # сообщений в секунду на весь бот
+BROADCAST_PER_CHAT_RATE = float(os.getenv('BROADCAST_PER_CHAT_RATE', '1'))  # сообщений в секунду в один чат
+RATE_MAX_RETRIES = int(os.getenv('RATE_MAX_RETRIES', '3'))  # повторов после 429 Too Many Requests
+RATE_MIN = float(os.getenv('RATE_MIN', '1'))  # нижняя граница скорости после 429, сообщений в секунду
+RATE_DECREASE_FACTOR = float(os.getenv('RATE_DECREASE_FACTOR', '0.5'))  # во сколько раз снижать скорость при 429
+RATE_RECOVERY_STEP = float(os.getenv('RATE_RECOVERY_STEP', '1'))  # прирост скорости в секунду без ошибок
+OUTBOUND_RESERVED_SHARE = float(os.getenv('OUTBOUND_RESERVED_SHARE', '0.1'))  # доля скорости, недоступная рассылкам
+DELIVERY_LEDGER_BATCH = int(os.getenv('DELIVERY_LEDGER_BATCH', '500'))  # записей журнала доставки на транзакцию
+DELIVERY_LEDGER_FLUSH_INTERVAL = float(os.getenv('DELIVERY_LEDGER_FLUSH_INTERVAL', '2'))  # секунд между сбросами
+PROGRESS_EDIT_INTERVAL = float(os.getenv('PROGRESS_EDIT_INTERVAL', '5'))  # секунд между правками отчета о рассылке
+
+# Кэш изображений для рассылок
+MEDIA_CACHE_MAX_ENTRIES = int(os.getenv('MEDIA_CACHE_MAX_ENTRIES', '1000'))
+MEDIA_CACHE_TTL_DAYS = int(os.getenv('MEDIA_CACHE_TTL_DAYS', '30'))
+MEDIA_DOWNLOAD_TIMEOUT = float(os.getenv('MEDIA_DOWNLOAD_TIMEOUT', '15'))  # секунд
+MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', str(10 * 1024 * 1024)))  # лимит Telegram на фото
+
+# Режим доставки: sync (TeleBot + пул потоков) или async (AsyncTeleBot + общая HTTP-сессия)
+DELIVERY_MODE = os.getenv('DELIVERY_MODE', 'sync').strip().lower()
+ASYNC_CONCURRENCY = int(os.getenv('ASYNC_CONCURRENCY', '500'))  # одновременных запросов в async режиме
+
+# Многопроцессная рассылка по шардам (1 — выключена)
+BROADCAST_PROCESSES = int(os.getenv('BROADCAST_PROCESSES', '1'))
+BROADCAST_SHARDS = int(os.getenv('BROADCAST_SHARDS', '0'))  # 0 — по 4 шарда на процесс
+SHARD_STALE_TIMEOUT = int(os.getenv('SHARD_STALE_TIMEOUT', '300'))  # секунд без heartbeat до перезахвата шарда
+SHARD_HEARTBEAT_INTERVAL = float(os.getenv('SHARD_HEARTBEAT_INTERVAL', '30'))  # секунд
+
+# Досылка постов, просроченных за время простоя бота
+CATCHUP_WORKERS = int(os.getenv('CATCHUP_WORKERS', '2'))  # постов, отправляемых одновременно
+CATCHUP_ORDER = os.getenv('CATCHUP_ORDER', 'oldest').strip().lower()  # oldest или group_first
+
+# Метрики в формате Prometheus (0 — эндпоинт выключен)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+
+# Профилирование рассылок, задач и обработчиков (можно включить командой /profile)
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')  # каталог для .prof, .folded и сводок .txt
+PROFILE_TOP = int(os.getenv('PROFILE_TOP', '25'))  # функций в сводке
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))  # секунд между выборками стеков
+
+# Прием обновлений через webhook (пустой WEBHOOK_URL — long polling)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '').strip()  # внешний HTTPS-адрес, например https://bot.example.com
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)  # без значения — новый на каждый запуск
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '16'))  # потоков обработки обновлений
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))  # обновлений в очереди сверх занятых воркеров
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))  # соединений со стороны Telegram
+WEBHOOK_SSL_CERT = os.getenv('WEBHOOK_SSL_CERT')  # не нужен за обратным прокси с TLS
+WEBHOOK_SSL_KEY = os.getenv('WEBHOOK_SSL_KEY')
+
 if not BOT_TOKEN:
     raise ValueError("❌ BOT_TOKEN не найден в .env файле")
 
@@ -18,4 +91,13 @@ if not ADMIN_USERNAMES:
 if not GROUP_CHAT_ID:
     raise ValueError("❌ GROUP_CHAT_ID не найден в .env файле")
 
+if DELIVERY_MODE not in ('sync', 'async'):
+    raise ValueError(f"❌ Неизвестный DELIVERY_MODE: {DELIVERY_MODE} (допустимо sync или async)")
+
+if not 0 <= OUTBOUND_RESERVED_SHARE < 1:
+    raise ValueError("❌ OUTBOUND_RESERVED_SHARE должен быть в диапазоне [0, 1)")
+
+if not re.fullmatch(r'[A-Za-z0-9_-]{1,256}', WEBHOOK_SECRET):
+    raise ValueError("❌ WEBHOOK_SECRET: допустимы 1-256 символов A-Z, a-z, 0-9, _ и -")
+
 print(f"✅ Загружены админы: {ADMIN_USERNAMES}")
\ No newline at end of file
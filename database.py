@@ -1,182 +1,744 @@
 import sqlite3
 import logging
+import threading
+import time
 from datetime import datetime
+from config import DB_PATH, DB_BUSY_TIMEOUT, DB_MMAP_SIZE, SUBSCRIBERS_CHUNK_SIZE, COUNTERS_CACHE_TTL
 
 logger = logging.getLogger(__name__)
 
+# Версионированные миграции схемы. Номер миграции = индекс + 1,
+# текущая версия хранится в PRAGMA user_version. Новые миграции
+# добавляются только в конец списка.
+MIGRATIONS = [
+    # 1: базовая схема
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS subscribers (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS group_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            author_username TEXT,
+            message_text TEXT,
+            image_url TEXT,
+            scheduled_time TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent BOOLEAN DEFAULT FALSE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS mailing_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            author_username TEXT,
+            message_text TEXT,
+            image_url TEXT,
+            scheduled_time TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent BOOLEAN DEFAULT FALSE
+        )
+        ''',
+    ],
+    # 2: индексы для выборки ожидающих постов и постов автора
+    [
+        'CREATE INDEX IF NOT EXISTS idx_group_posts_sent_time ON group_posts (sent, scheduled_time)',
+        'CREATE INDEX IF NOT EXISTS idx_group_posts_author ON group_posts (author_username, sent, scheduled_time)',
+        'CREATE INDEX IF NOT EXISTS idx_mailing_posts_sent_time ON mailing_posts (sent, scheduled_time)',
+        'CREATE INDEX IF NOT EXISTS idx_mailing_posts_author ON mailing_posts (author_username, sent, scheduled_time)',
+    ],
+    # 3: журнал доставки рассылок по получателям
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS mailing_deliveries (
+            mailing_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (mailing_id, user_id)
+        ) WITHOUT ROWID
+        ''',
+    ],
+    # 4: счетчики, которые поддерживаются триггерами
+    [
+        'CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID',
+        "INSERT OR REPLACE INTO counters SELECT 'subscribers', COUNT(*) FROM subscribers",
+        "INSERT OR REPLACE INTO counters SELECT 'group_posts', COUNT(*) FROM group_posts",
+        "INSERT OR REPLACE INTO counters SELECT 'group_posts_sent', COUNT(*) FROM group_posts WHERE sent",
+        "INSERT OR REPLACE INTO counters SELECT 'mailing_posts', COUNT(*) FROM mailing_posts",
+        "INSERT OR REPLACE INTO counters SELECT 'mailing_posts_sent', COUNT(*) FROM mailing_posts WHERE sent",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_subscribers_count_insert AFTER INSERT ON subscribers
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'subscribers';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_subscribers_count_delete AFTER DELETE ON subscribers
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'subscribers';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_group_posts_count_insert AFTER INSERT ON group_posts
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'group_posts';
+            UPDATE counters SET value = value + 1 WHERE name = 'group_posts_sent' AND NEW.sent;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_group_posts_count_delete AFTER DELETE ON group_posts
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'group_posts';
+            UPDATE counters SET value = value - 1 WHERE name = 'group_posts_sent' AND OLD.sent;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_group_posts_count_sent AFTER UPDATE OF sent ON group_posts
+        WHEN OLD.sent IS NOT NEW.sent
+        BEGIN
+            UPDATE counters SET value = value + (CASE WHEN NEW.sent THEN 1 ELSE -1 END)
+            WHERE name = 'group_posts_sent';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_mailing_posts_count_insert AFTER INSERT ON mailing_posts
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'mailing_posts';
+            UPDATE counters SET value = value + 1 WHERE name = 'mailing_posts_sent' AND NEW.sent;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_mailing_posts_count_delete AFTER DELETE ON mailing_posts
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'mailing_posts';
+            UPDATE counters SET value = value - 1 WHERE name = 'mailing_posts_sent' AND OLD.sent;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_mailing_posts_count_sent AFTER UPDATE OF sent ON mailing_posts
+        WHEN OLD.sent IS NOT NEW.sent
+        BEGIN
+            UPDATE counters SET value = value + (CASE WHEN NEW.sent THEN 1 ELSE -1 END)
+            WHERE name = 'mailing_posts_sent';
+        END
+        ''',
+    ],
+    # 5: кэш file_id загруженных изображений
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS media_cache (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT,
+            file_id TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_media_cache_hash ON media_cache (content_hash)',
+        'CREATE INDEX IF NOT EXISTS idx_media_cache_last_used ON media_cache (last_used_at)',
+    ],
+    # 6: мягкое удаление подписчиков, заблокировавших бота
+    [
+        'ALTER TABLE subscribers ADD COLUMN active INTEGER NOT NULL DEFAULT 1',
+        'ALTER TABLE subscribers ADD COLUMN blocked_at TIMESTAMP',
+        'DROP TRIGGER IF EXISTS trg_subscribers_count_insert',
+        'DROP TRIGGER IF EXISTS trg_subscribers_count_delete',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_subscribers_count_insert AFTER INSERT ON subscribers
+        WHEN NEW.active
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'subscribers';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_subscribers_count_delete AFTER DELETE ON subscribers
+        WHEN OLD.active
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'subscribers';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_subscribers_count_active AFTER UPDATE OF active ON subscribers
+        WHEN OLD.active IS NOT NEW.active
+        BEGIN
+            UPDATE counters SET value = value + (CASE WHEN NEW.active THEN 1 ELSE -1 END)
+            WHERE name = 'subscribers';
+        END
+        ''',
+    ],
+    # 7: очередь шардов для многопроцессной рассылки
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mailing_id INTEGER,
+            message_text TEXT,
+            image_url TEXT,
+            parse_mode TEXT,
+            rate REAL NOT NULL,
+            workers INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_shards (
+            job_id INTEGER NOT NULL,
+            shard_no INTEGER NOT NULL,
+            min_user_id INTEGER,
+            max_user_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            heartbeat_at TIMESTAMP,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (job_id, shard_no)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_broadcast_shards_status ON broadcast_shards (status, job_id)',
+    ],
+    # 8: постоянное хранилище задач APScheduler и разовый перенос уже запланированных постов
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS scheduler_jobs (
+            id TEXT PRIMARY KEY,
+            next_run_time REAL,
+            job_state BLOB NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_scheduler_jobs_next_run ON scheduler_jobs (next_run_time)',
+        '''
+        CREATE TABLE IF NOT EXISTS scheduler_backfill (
+            kind TEXT NOT NULL,
+            post_id INTEGER NOT NULL,
+            scheduled_time TIMESTAMP NOT NULL,
+            PRIMARY KEY (kind, post_id)
+        )
+        ''',
+        "INSERT INTO scheduler_backfill SELECT 'group', id, scheduled_time FROM group_posts WHERE sent = FALSE",
+        "INSERT INTO scheduler_backfill SELECT 'mailing', id, scheduled_time FROM mailing_posts WHERE sent = FALSE",
+    ],
+    # 9: черновики постов и рассылок, ожидающие нажатия кнопки
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS drafts (
+            kind TEXT NOT NULL,
+            draft_key TEXT NOT NULL,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (kind, draft_key)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_drafts_expires ON drafts (expires_at)',
+    ],
+    # 10: режим разметки поста, чтобы досылка без задачи отправляла его так же;
+    # старые посты раньше всегда отправлялись с HTML
+    [
+        "ALTER TABLE group_posts ADD COLUMN parse_mode TEXT DEFAULT 'HTML'",
+        "ALTER TABLE mailing_posts ADD COLUMN parse_mode TEXT DEFAULT 'HTML'",
+    ],
+]
+
 
 class Database:
-    def __init__(self, db_path='bot.db'):
+    def __init__(self, db_path=DB_PATH):
         self.db_path = db_path
+        # Одно долгоживущее соединение на поток
+        self._local = threading.local()
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        self._counters_cache = None
+        self._counters_cached_at = 0.0
         self.init_db()
 
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT / 1000, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT}')
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        return conn
+
+    def get_connection(self):
+        """Соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+
+        conn = self._connect()
+        self._local.conn = conn
+        with self._connections_lock:
+            # Закрываем соединения потоков, которые уже завершились
+            for thread in [t for t in self._connections if not t.is_alive()]:
+                self._connections.pop(thread).close()
+            self._connections[threading.current_thread()] = conn
+        return conn
+
+    def close(self):
+        """Закрытие всех соединений"""
+        with self._connections_lock:
+            for conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.error(f"❌ Ошибка закрытия соединения с БД: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+        logger.info("🔒 Соединения с базой данных закрыты")
+
     def init_db(self):
-        """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS subscribers (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS group_posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                author_username TEXT,
-                message_text TEXT,
-                image_url TEXT,
-                scheduled_time TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                sent BOOLEAN DEFAULT FALSE
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS mailing_posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                author_username TEXT,
-                message_text TEXT,
-                image_url TEXT,
-                scheduled_time TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                sent BOOLEAN DEFAULT FALSE
-            )
-        ''')
+        """Инициализация базы данных и применение миграций"""
+        conn = self.get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            try:
+                conn.execute('BEGIN')
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {number}')
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                logger.error(f"❌ Ошибка применения миграции {number}")
+                raise
+            logger.info(f"🧱 Применена миграция схемы БД: {number}")
 
-        conn.commit()
-        conn.close()
         logger.info("✅ База данных инициализирована")
 
     def add_subscriber(self, user_id, username, first_name, last_name):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO subscribers 
-            (user_id, username, first_name, last_name)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, username, first_name, last_name))
-        conn.commit()
-        conn.close()
+        return self.add_subscribers([(user_id, username, first_name, last_name)])
+
+    def add_subscribers(self, rows):
+        """Пакетная запись подписчиков [(user_id, username, first_name, last_name), ...]"""
+        conn = self.get_connection()
+        with conn:
+            conn.executemany('''
+                INSERT INTO subscribers (user_id, username, first_name, last_name)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    active = 1,
+                    blocked_at = NULL
+            ''', rows)
         return True
 
     def get_all_subscribers(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id FROM subscribers')
-        rows = cursor.fetchall()
-        conn.close()
+        conn = self.get_connection()
+        rows = conn.execute('SELECT user_id FROM subscribers WHERE active = 1').fetchall()
         return [row[0] for row in rows]
 
+    def deactivate_subscribers(self, user_ids):
+        """Мягкое удаление подписчиков, недоступных для рассылки, одной транзакцией"""
+        conn = self.get_connection()
+        with conn:
+            conn.executemany('''
+                UPDATE subscribers SET active = 0, blocked_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND active = 1
+            ''', [(user_id,) for user_id in user_ids])
+        return True
+
+    def get_counters(self):
+        """
+        Счетчики подписчиков и постов. Значения ведут триггеры в таблице counters,
+        поэтому чтение — O(1); результат дополнительно кэшируется в памяти на короткое время.
+        """
+        now = time.monotonic()
+        cached = self._counters_cache
+        if cached is not None and now - self._counters_cached_at < COUNTERS_CACHE_TTL:
+            return cached
+
+        conn = self.get_connection()
+        counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+        self._counters_cache = counters
+        self._counters_cached_at = now
+        return counters
+
+    def get_subscribers_count(self):
+        return self.get_counters().get('subscribers', 0)
+
+    def iter_subscribers(self, chunk_size=SUBSCRIBERS_CHUNK_SIZE, mailing_id=None,
+                         min_user_id=None, max_user_id=None):
+        """
+        Постраничный обход активных подписчиков по user_id без загрузки всей таблицы.
+        Если передан mailing_id, пропускаются получатели, которым рассылка уже доставлена;
+        получатели с ошибкой доставки (таймаут, 5xx, 429 сверх повторов) обходятся снова.
+        min_user_id/max_user_id ограничивают диапазон (включительно) для шардов рассылки.
+        """
+        query = 'SELECT user_id FROM subscribers s WHERE s.user_id > ? AND s.active = 1'
+        extra_params = []
+        if max_user_id is not None:
+            query += ' AND s.user_id <= ?'
+            extra_params.append(max_user_id)
+        if mailing_id is not None:
+            query += '''
+                AND NOT EXISTS (
+                    SELECT 1 FROM mailing_deliveries d
+                    WHERE d.mailing_id = ? AND d.user_id = s.user_id AND d.status = 'sent'
+                )'''
+            extra_params.append(mailing_id)
+        query += ' ORDER BY s.user_id LIMIT ?'
+
+        last_id = -1 if min_user_id is None else min_user_id - 1
+        while True:
+            conn = self.get_connection()
+            rows = conn.execute(query, (last_id, *extra_params, chunk_size)).fetchall()
+
+            for row in rows:
+                yield row[0]
+
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    def get_subscriber_boundaries(self, parts):
+        """user_id, делящие активных подписчиков на parts примерно равных диапазонов"""
+        conn = self.get_connection()
+        total = conn.execute('SELECT COUNT(*) FROM subscribers WHERE active = 1').fetchone()[0]
+        boundaries = []
+        for part in range(1, parts):
+            row = conn.execute(
+                'SELECT user_id FROM subscribers WHERE active = 1 ORDER BY user_id LIMIT 1 OFFSET ?',
+                (total * part // parts,)
+            ).fetchone()
+            if row and (not boundaries or row[0] > boundaries[-1]):
+                boundaries.append(row[0])
+        return boundaries
+
+    # Журнал доставки рассылок
+    def record_deliveries(self, mailing_id, deliveries):
+        """Запись пачки результатов доставки [(user_id, status), ...] одной транзакцией"""
+        conn = self.get_connection()
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO mailing_deliveries (mailing_id, user_id, status)
+                VALUES (?, ?, ?)
+            ''', [(mailing_id, user_id, status) for user_id, status in deliveries])
+        return True
+
+    def count_deliveries(self, mailing_id):
+        """Количество получателей, которым рассылка уже доставлена"""
+        conn = self.get_connection()
+        return conn.execute(
+            "SELECT COUNT(*) FROM mailing_deliveries WHERE mailing_id = ? AND status = 'sent'", (mailing_id,)
+        ).fetchone()[0]
+
+    # Очередь шардов рассылки
+    def create_broadcast_job(self, mailing_id, message_text, image_url, parse_mode, rate, workers, ranges):
+        """Создание задания рассылки и его шардов [(min_user_id, max_user_id), ...] одной транзакцией"""
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO broadcast_jobs (mailing_id, message_text, image_url, parse_mode, rate, workers)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (mailing_id, message_text, image_url, parse_mode, rate, workers))
+            job_id = cursor.lastrowid
+            conn.executemany('''
+                INSERT INTO broadcast_shards (job_id, shard_no, min_user_id, max_user_id)
+                VALUES (?, ?, ?, ?)
+            ''', [(job_id, shard_no, low, high) for shard_no, (low, high) in enumerate(ranges)])
+        return job_id
+
+    def get_broadcast_job(self, job_id):
+        conn = self.get_connection()
+        return conn.execute('''
+            SELECT id, mailing_id, message_text, image_url, parse_mode, rate, workers, status
+            FROM broadcast_jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+
+    def claim_broadcast_shard(self, worker, job_id=None, stale_seconds=300):
+        """
+        Захват свободного шарда (или шарда, воркер которого перестал отвечать).
+        Возвращает (job_id, shard_no, min_user_id, max_user_id) или None.
+        """
+        conn = self.get_connection()
+        query = '''
+            SELECT s.job_id, s.shard_no, s.min_user_id, s.max_user_id
+            FROM broadcast_shards s JOIN broadcast_jobs j ON j.id = s.job_id
+            WHERE j.status = 'running'
+              AND (s.status = 'pending'
+                   OR (s.status = 'running' AND s.heartbeat_at < datetime('now', ?)))
+        '''
+        params = [f'-{stale_seconds} seconds']
+        if job_id is not None:
+            query += ' AND s.job_id = ?'
+            params.append(job_id)
+        query += ' ORDER BY s.job_id, s.shard_no LIMIT 1'
+
+        # BEGIN IMMEDIATE сразу берет блокировку записи, чтобы два воркера не захватили один шард
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(query, params).fetchone()
+            if row:
+                conn.execute('''
+                    UPDATE broadcast_shards
+                    SET status = 'running', worker = ?, heartbeat_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ? AND shard_no = ?
+                ''', (worker, row[0], row[1]))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        return row
+
+    def update_broadcast_shard(self, job_id, shard_no, sent, failed, status='running'):
+        """Прогресс шарда; заодно служит heartbeat воркера"""
+        conn = self.get_connection()
+        with conn:
+            conn.execute('''
+                UPDATE broadcast_shards
+                SET sent = ?, failed = ?, status = ?, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE job_id = ? AND shard_no = ?
+            ''', (sent, failed, status, job_id, shard_no))
+        return True
+
+    def count_broadcast_workers(self, stale_seconds=300):
+        """Число воркеров, которые сейчас рассылают шарды (heartbeat не старше stale_seconds)"""
+        conn = self.get_connection()
+        return conn.execute('''
+            SELECT COUNT(DISTINCT s.worker)
+            FROM broadcast_shards s JOIN broadcast_jobs j ON j.id = s.job_id
+            WHERE j.status = 'running' AND s.status = 'running' AND s.heartbeat_at >= datetime('now', ?)
+        ''', (f'-{stale_seconds} seconds',)).fetchone()[0]
+
+    def get_broadcast_shards(self, job_id):
+        conn = self.get_connection()
+        return conn.execute('''
+            SELECT shard_no, min_user_id, max_user_id, status, worker, sent, failed
+            FROM broadcast_shards WHERE job_id = ? ORDER BY shard_no
+        ''', (job_id,)).fetchall()
+
+    def finish_broadcast_job(self, job_id):
+        conn = self.get_connection()
+        with conn:
+            conn.execute('''
+                UPDATE broadcast_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE id = ?
+            ''', (job_id,))
+        return True
+
     # Методы для постов в группу
-    def add_group_post(self, author_username, message_text, image_url, scheduled_time):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO group_posts 
-            (author_username, message_text, image_url, scheduled_time)
-            VALUES (?, ?, ?, ?)
-        ''', (author_username, message_text, image_url, scheduled_time))
-        post_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return post_id
+    def add_group_post(self, author_username, message_text, image_url, scheduled_time, parse_mode="HTML"):
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO group_posts
+                (author_username, message_text, image_url, scheduled_time, parse_mode)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (author_username, message_text, image_url, scheduled_time, parse_mode))
+        return cursor.lastrowid
 
     def get_pending_group_posts(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, author_username, message_text, image_url, scheduled_time 
-            FROM group_posts 
-            WHERE sent = FALSE AND scheduled_time <= datetime('now')
-        ''')
-        posts = cursor.fetchall()
-        conn.close()
-        return posts
+        """Просроченные неотправленные посты без задачи в планировщике"""
+        conn = self.get_connection()
+        # scheduled_time хранится как локальное время в isoformat, сравниваем в том же формате
+        return conn.execute('''
+            SELECT id, author_username, message_text, image_url, scheduled_time
+            FROM group_posts
+            WHERE sent = FALSE AND scheduled_time <= ?
+            AND NOT EXISTS (SELECT 1 FROM scheduler_jobs WHERE id = 'group_post_' || group_posts.id)
+        ''', (datetime.now().isoformat(),)).fetchall()
+
+    def get_group_post(self, post_id):
+        conn = self.get_connection()
+        return conn.execute('''
+            SELECT id, author_username, message_text, image_url, scheduled_time, sent, parse_mode
+            FROM group_posts
+            WHERE id = ?
+        ''', (post_id,)).fetchone()
 
     def get_all_group_posts(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
+        conn = self.get_connection()
+        return conn.execute('''
+            SELECT id, author_username, message_text, image_url, scheduled_time, sent
+            FROM group_posts
+            ORDER BY scheduled_time
+        ''').fetchall()
+
+    def get_scheduled_group_posts(self, author_username=None):
+        """Неотправленные посты в группу (опционально только одного автора)"""
+        conn = self.get_connection()
+        if author_username is None:
+            return conn.execute('''
+                SELECT id, author_username, message_text, image_url, scheduled_time, sent
+                FROM group_posts
+                WHERE sent = FALSE
+                ORDER BY scheduled_time
+            ''').fetchall()
+        return conn.execute('''
             SELECT id, author_username, message_text, image_url, scheduled_time, sent
-            FROM group_posts 
+            FROM group_posts
+            WHERE author_username = ? AND sent = FALSE
             ORDER BY scheduled_time
-        ''')
-        posts = cursor.fetchall()
-        conn.close()
-        return posts
+        ''', (author_username,)).fetchall()
 
     def mark_group_post_as_sent(self, post_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE group_posts SET sent = TRUE WHERE id = ?', (post_id,))
-        conn.commit()
-        conn.close()
+        conn = self.get_connection()
+        with conn:
+            conn.execute('UPDATE group_posts SET sent = TRUE WHERE id = ?', (post_id,))
         return True
 
     def delete_group_post(self, post_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM group_posts WHERE id = ?', (post_id,))
-        conn.commit()
-        conn.close()
+        conn = self.get_connection()
+        with conn:
+            conn.execute('DELETE FROM group_posts WHERE id = ?', (post_id,))
         return True
 
     # Методы для рассылок
-    def add_mailing_post(self, author_username, message_text, image_url, scheduled_time):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO mailing_posts 
-            (author_username, message_text, image_url, scheduled_time)
-            VALUES (?, ?, ?, ?)
-        ''', (author_username, message_text, image_url, scheduled_time))
-        post_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return post_id
+    def add_mailing_post(self, author_username, message_text, image_url, scheduled_time, parse_mode="HTML"):
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO mailing_posts
+                (author_username, message_text, image_url, scheduled_time, parse_mode)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (author_username, message_text, image_url, scheduled_time, parse_mode))
+        return cursor.lastrowid
 
     def get_pending_mailing_posts(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, author_username, message_text, image_url, scheduled_time 
-            FROM mailing_posts 
-            WHERE sent = FALSE AND scheduled_time <= datetime('now')
-        ''')
-        posts = cursor.fetchall()
-        conn.close()
-        return posts
+        """Просроченные неотправленные рассылки без задачи в планировщике"""
+        conn = self.get_connection()
+        # scheduled_time хранится как локальное время в isoformat, сравниваем в том же формате
+        return conn.execute('''
+            SELECT id, author_username, message_text, image_url, scheduled_time
+            FROM mailing_posts
+            WHERE sent = FALSE AND scheduled_time <= ?
+            AND NOT EXISTS (SELECT 1 FROM scheduler_jobs WHERE id = 'mailing_' || mailing_posts.id)
+        ''', (datetime.now().isoformat(),)).fetchall()
+
+    def get_mailing_post(self, post_id):
+        conn = self.get_connection()
+        return conn.execute('''
+            SELECT id, author_username, message_text, image_url, scheduled_time, sent, parse_mode
+            FROM mailing_posts
+            WHERE id = ?
+        ''', (post_id,)).fetchone()
 
     def get_all_mailing_posts(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
+        conn = self.get_connection()
+        return conn.execute('''
             SELECT id, author_username, message_text, image_url, scheduled_time, sent
-            FROM mailing_posts 
+            FROM mailing_posts
             ORDER BY scheduled_time
-        ''')
-        posts = cursor.fetchall()
-        conn.close()
-        return posts
+        ''').fetchall()
+
+    def get_scheduled_mailing_posts(self):
+        """Неотправленные рассылки"""
+        conn = self.get_connection()
+        return conn.execute('''
+            SELECT id, author_username, message_text, image_url, scheduled_time, sent
+            FROM mailing_posts
+            WHERE sent = FALSE
+            ORDER BY scheduled_time
+        ''').fetchall()
 
     def mark_mailing_post_as_sent(self, post_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE mailing_posts SET sent = TRUE WHERE id = ?', (post_id,))
-        conn.commit()
-        conn.close()
+        conn = self.get_connection()
+        with conn:
+            conn.execute('UPDATE mailing_posts SET sent = TRUE WHERE id = ?', (post_id,))
+            # Журнал нужен только для возобновления незавершенной рассылки
+            conn.execute('DELETE FROM mailing_deliveries WHERE mailing_id = ?', (post_id,))
         return True
 
     def delete_mailing_post(self, post_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM mailing_posts WHERE id = ?', (post_id,))
-        conn.commit()
-        conn.close()
-        return True
\ No newline at end of file
+        conn = self.get_connection()
+        with conn:
+            conn.execute('DELETE FROM mailing_posts WHERE id = ?', (post_id,))
+            conn.execute('DELETE FROM mailing_deliveries WHERE mailing_id = ?', (post_id,))
+        return True
+
+    # Перенос запланированных постов в хранилище задач
+    def get_scheduler_backfill(self):
+        """Неотправленные посты, созданные до появления хранилища задач"""
+        conn = self.get_connection()
+        return conn.execute(
+            'SELECT kind, post_id, scheduled_time FROM scheduler_backfill ORDER BY scheduled_time'
+        ).fetchall()
+
+    def clear_scheduler_backfill(self):
+        conn = self.get_connection()
+        with conn:
+            conn.execute('DELETE FROM scheduler_backfill')
+        return True
+
+    # Черновики
+    def save_draft(self, kind, draft_key, data, expires_at):
+        conn = self.get_connection()
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO drafts (kind, draft_key, data, expires_at)
+                VALUES (?, ?, ?, ?)
+            ''', (kind, draft_key, data, expires_at))
+        return True
+
+    def get_draft(self, kind, draft_key, now):
+        """(data, expires_at) черновика или None, если его нет или он истек"""
+        conn = self.get_connection()
+        return conn.execute(
+            'SELECT data, expires_at FROM drafts WHERE kind = ? AND draft_key = ? AND expires_at > ?',
+            (kind, draft_key, now)
+        ).fetchone()
+
+    def delete_draft(self, kind, draft_key):
+        conn = self.get_connection()
+        with conn:
+            conn.execute('DELETE FROM drafts WHERE kind = ? AND draft_key = ?', (kind, draft_key))
+        return True
+
+    def purge_drafts(self, now):
+        """Удаление истекших черновиков, возвращает количество удаленных"""
+        conn = self.get_connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM drafts WHERE expires_at <= ?', (now,))
+        return cursor.rowcount
+
+    # Кэш медиа
+    def get_media_file_id(self, url=None, content_hash=None):
+        """Поиск file_id по URL или по хэшу содержимого с отметкой использования"""
+        conn = self.get_connection()
+        if url is not None:
+            row = conn.execute('SELECT url, file_id FROM media_cache WHERE url = ?', (url,)).fetchone()
+        else:
+            row = conn.execute(
+                'SELECT url, file_id FROM media_cache WHERE content_hash = ? LIMIT 1', (content_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute('UPDATE media_cache SET last_used_at = CURRENT_TIMESTAMP WHERE url = ?', (row[0],))
+        return row[1]
+
+    def save_media_file_id(self, url, content_hash, file_id):
+        conn = self.get_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO media_cache (url, content_hash, file_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    file_id = excluded.file_id,
+                    last_used_at = CURRENT_TIMESTAMP
+            ''', (url, content_hash, file_id))
+        return True
+
+    def evict_media_cache(self, max_entries, ttl_days):
+        """Удаление устаревших записей и самых давно использованных сверх лимита"""
+        conn = self.get_connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM media_cache WHERE last_used_at < datetime('now', ?)", (f'-{ttl_days} days',)
+            )
+            conn.execute('''
+                DELETE FROM media_cache WHERE url IN (
+                    SELECT url FROM media_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (max_entries,))
+        return True
@@ -1,5 +1,10 @@
+import html
+import os
+import time
 from datetime import datetime
 from utils.helpers import is_admin, format_post_preview
+from utils.message_parser import preview_cache
+from utils.profiling import profiler
 
 
 def setup_admin_handlers(bot, db, scheduler):
@@ -14,11 +19,10 @@ def setup_admin_handlers(bot, db, scheduler):
             bot.reply_to(message, "❌ <b>У вас нет прав для этой команды.</b>", parse_mode='HTML')
             return
 
-        group_posts = db.get_all_group_posts()
-        mailing_posts = db.get_all_mailing_posts()
+        group_posts = db.get_scheduled_group_posts()
+        mailing_posts = db.get_scheduled_mailing_posts()
 
-        all_posts = [(p, 'group') for p in group_posts if not p[5]] + [(p, 'mailing') for p in mailing_posts if
-                                                                       not p[5]]
+        all_posts = [(p, 'group') for p in group_posts] + [(p, 'mailing') for p in mailing_posts]
 
         if not all_posts:
             bot.reply_to(message, "📭 <b>Нет запланированных постов.</b>", parse_mode='HTML')
@@ -33,7 +37,7 @@ def setup_admin_handlers(bot, db, scheduler):
             type_emoji = "📝" if post_type == 'group' else "📧"
             type_text = "Пост в группу" if post_type == 'group' else "Рассылка"
 
-            preview = format_post_preview(post_text, 40)
+            preview = format_post_preview(post_text, 40, post_id, post_type)
             time_str = datetime.fromisoformat(scheduled_time).strftime('%d.%m.%Y %H:%M')
 
             response += f"""
@@ -67,6 +71,8 @@ def setup_admin_handlers(bot, db, scheduler):
 
             db.delete_group_post(post_id)
             db.delete_mailing_post(post_id)
+            preview_cache.invalidate('group', post_id)
+            preview_cache.invalidate('mailing', post_id)
 
             try:
                 scheduler.scheduler.remove_job(f'group_post_{post_id}')
@@ -94,29 +100,95 @@ def setup_admin_handlers(bot, db, scheduler):
             bot.reply_to(message, "❌ <b>У вас нет прав для этой команды.</b>", parse_mode='HTML')
             return
 
-        subscribers = db.get_all_subscribers()
-        group_posts = db.get_all_group_posts()
-        mailing_posts = db.get_all_mailing_posts()
+        counters = db.get_counters()
+        rate = scheduler.rate_controller.snapshot()
+        lanes = rate['lanes']
 
-        sent_group = len([p for p in group_posts if p[5]])
-        pending_group = len([p for p in group_posts if not p[5]])
-        sent_mailing = len([p for p in mailing_posts if p[5]])
-        pending_mailing = len([p for p in mailing_posts if not p[5]])
+        total_group = counters.get('group_posts', 0)
+        sent_group = counters.get('group_posts_sent', 0)
+        total_mailing = counters.get('mailing_posts', 0)
+        sent_mailing = counters.get('mailing_posts_sent', 0)
 
         stats_text = f"""
 <b>📊 Статистика бота:</b>
 
-👥 <b>Подписчиков:</b> {len(subscribers)}
+👥 <b>Подписчиков:</b> {counters.get('subscribers', 0)}
 
 <b>📝 Посты в группу:</b>
-• Всего: {len(group_posts)}
+• Всего: {total_group}
 • Отправлено: {sent_group}
-• Ожидает: {pending_group}
+• Ожидает: {total_group - sent_group}
 
 <b>📧 Рассылки:</b>
-• Всего: {len(mailing_posts)}
+• Всего: {total_mailing}
 • Отправлено: {sent_mailing}
-• Ожидает: {pending_mailing}
+• Ожидает: {total_mailing - sent_mailing}
+
+<b>🚦 Отправка:</b>
+• Скорость: {rate['rate']:.1f} из {rate['base_rate']:.0f} сообщ/с
+• Пауза после 429: {rate['paused_for']:.0f} с
+• Ответов 429 / повторов: {rate['throttled_total']} / {rate['retries_total']}
+• Ждут отправки: ответы {lanes['interactive']['waiting']}, группа {lanes['group']['waiting']}, рассылки {lanes['bulk']['waiting']}
         """
 
-        bot.reply_to(message, stats_text, parse_mode='HTML')
\ No newline at end of file
+        bot.reply_to(message, stats_text, parse_mode='HTML')
+
+    @bot.message_handler(commands=['catchup'])
+    def catchup_command(message):
+        """Ход досылки постов, просроченных за время простоя"""
+        user = message.from_user
+
+        if not is_admin(user.username):
+            bot.reply_to(message, "❌ <b>У вас нет прав для этой команды.</b>", parse_mode='HTML')
+            return
+
+        progress = scheduler.catchup.snapshot()
+        if not progress['total']:
+            bot.reply_to(message, "✅ <b>Просроченных постов после запуска не было.</b>", parse_mode='HTML')
+            return
+
+        counts = progress['counts']
+        response = f"""
+<b>⏳ Досылка просроченных постов:</b>
+
+• Всего: {progress['total']}
+• В очереди: {counts['pending']}
+• Отправляется: {counts['running']}
+• Отправлено: {counts['done']}
+• С ошибкой: {counts['failed']}
+• Уже отправлены или удалены: {counts['skipped']}
+        """
+
+        subscribers = db.get_counters().get('subscribers', 0)
+        for item in progress['running']:
+            elapsed = time.monotonic() - item.started_at
+            if item.kind == 'group':
+                response += f"\n📝 Пост в группу ID: {item.post_id} — {elapsed:.0f} с"
+            else:
+                delivered = db.count_deliveries(item.post_id)
+                response += (f"\n📧 Рассылка ID: {item.post_id} — доставлено {delivered} из {subscribers} "
+                             f"подписчиков, {elapsed:.0f} с")
+
+        bot.reply_to(message, response, parse_mode='HTML')
+
+    @bot.message_handler(commands=['profile'])
+    def profile_command(message):
+        """Включение и выключение профилирования: /profile on|off"""
+        user = message.from_user
+
+        if not is_admin(user.username):
+            bot.reply_to(message, "❌ <b>У вас нет прав для этой команды.</b>", parse_mode='HTML')
+            return
+
+        args = message.text.split()[1:]
+        if args and args[0].lower() in ('on', 'off'):
+            profiler.enabled = args[0].lower() == 'on'
+
+        state = "включено" if profiler.enabled else "выключено"
+        bot.reply_to(message,
+                     f"🔬 <b>Профилирование {state}.</b>\n\n"
+                     f"📁 <b>Каталог:</b> <code>{html.escape(os.path.abspath(profiler.directory))}</code>\n"
+                     "💡 Рассылки, запланированные посты и команды пишут профиль и сводку\n"
+                     "самых горячих функций на каждый запуск.\n"
+                     "<code>/profile on</code> — включить, <code>/profile off</code> — выключить",
+                     parse_mode='HTML')
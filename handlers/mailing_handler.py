@@ -2,14 +2,16 @@ import html
 import re
 from datetime import datetime
 from telebot import types
+from config import DRAFTS_PERSIST
+from utils.draft_store import DraftStore
 from utils.helpers import extract_message_data, format_post_preview, is_admin
 
 
 def setup_mailing_handlers(bot, db, scheduler):
     """Настройка обработчиков рассылок"""
 
-
-    bot.temp_mailing_data = {}
+    # Черновики рассылок до нажатия кнопки (с TTL, лимитом памяти и копией в БД)
+    drafts = DraftStore('mailing', db if DRAFTS_PERSIST else None)
 
     @bot.message_handler(commands=['mailing'])
     def mailing_command(message):
@@ -77,7 +79,7 @@ def setup_mailing_handlers(bot, db, scheduler):
 
     def ask_mailing_schedule(message, message_text, image_url, parse_mode):
         """Спросить когда отправлять рассылку"""
-        subscribers_count = len(db.get_all_subscribers())
+        subscribers_count = db.get_subscribers_count()
 
         markup = types.InlineKeyboardMarkup()
         btn_now = types.InlineKeyboardButton("🚀 Отправить сейчас", callback_data="mailing_now")
@@ -109,24 +111,24 @@ def setup_mailing_handlers(bot, db, scheduler):
 
 
         mailing_key = f"{sent_message.chat.id}:{sent_message.message_id}"
-        bot.temp_mailing_data[mailing_key] = {
+        drafts.put(mailing_key, {
             'message_text': message_text,
             'image_url': image_url,
             'parse_mode': parse_mode,
             'user_id': message.from_user.id,
             'original_message_id': sent_message.message_id
-        }
+        })
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('mailing_'))
     def handle_mailing_callback(call):
         """Обработка нажатий на кнопки рассылок"""
         mailing_key = f"{call.message.chat.id}:{call.message.message_id}"
 
-        if mailing_key not in bot.temp_mailing_data:
+        mailing_data = drafts.get(mailing_key)
+        if mailing_data is None:
             bot.answer_callback_query(call.id, "❌ Данные рассылки устарели. Создайте рассылку заново.")
             return
 
-        mailing_data = bot.temp_mailing_data[mailing_key]
         message_text = mailing_data['message_text']
         image_url = mailing_data['image_url']
         parse_mode = mailing_data['parse_mode']
@@ -160,7 +162,7 @@ def setup_mailing_handlers(bot, db, scheduler):
             parse_mode='HTML'
         )
 
-        bot.temp_mailing_data[mailing_key]['waiting_for_schedule'] = True
+        drafts.update(mailing_key, waiting_for_schedule=True)
 
         bot.register_next_step_handler_by_chat_id(
             call.message.chat.id,
@@ -193,10 +195,10 @@ def setup_mailing_handlers(bot, db, scheduler):
                 cleanup_mailing_data(bot, mailing_key)
                 return
 
-            subscribers_count = len(db.get_all_subscribers())
+            subscribers_count = db.get_subscribers_count()
 
             post_id = db.add_mailing_post(message.from_user.username, message_text, image_url,
-                                          scheduled_time.isoformat())
+                                          scheduled_time.isoformat(), parse_mode)
 
             scheduler.schedule_mailing_post(post_id, message_text, image_url, scheduled_time, parse_mode)
 
@@ -247,7 +249,7 @@ def setup_mailing_handlers(bot, db, scheduler):
 
     def handle_send_mailing_now(call, message_text, image_url, parse_mode, mailing_key):
         """Обработка кнопки 'Отправить сейчас' для рассылки"""
-        subscribers_count = len(db.get_all_subscribers())
+        subscribers_count = db.get_subscribers_count()
 
         if subscribers_count == 0:
             bot.edit_message_text(
@@ -263,41 +265,26 @@ def setup_mailing_handlers(bot, db, scheduler):
 
         bot.edit_message_text(
             f"📤 <b>Начинаю рассылку для {subscribers_count} подписчиков...</b>\n\n"
-            "⏳ <i>Это может занять несколько минут</i>",
+            "⏳ <i>Ход рассылки будет обновляться в этом сообщении</i>",
             call.message.chat.id,
             call.message.message_id,
             parse_mode='HTML'
         )
 
 
-        success_count, fail_count = scheduler.send_broadcast(message_text, image_url, parse_mode)
-
-
-        report_text = f"""
-<b>📊 Отчет о рассылке:</b>
-
-✅ <b>Успешно доставлено:</b> {success_count}
-❌ <b>Не доставлено:</b> {fail_count}
-👥 <b>Всего подписчиков:</b> {subscribers_count}
-
-💫 <b>Эффективность:</b> {(success_count / subscribers_count * 100) if subscribers_count > 0 else 0:.1f}%
-        """
-
-        bot.edit_message_text(
-            report_text,
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode='HTML'
-        )
+        # Сохраняем рассылку в БД, чтобы после перезапуска она продолжилась, а не началась заново
+        post_id = db.add_mailing_post(call.from_user.username, message_text, image_url,
+                                      datetime.now().isoformat(), parse_mode)
+        # Рассылка идет в фоне, отчет обновляется в этом же сообщении
+        scheduler.send_mailing_now(post_id, parse_mode, call.message.chat.id, call.message.message_id)
 
 
         cleanup_mailing_data(bot, mailing_key)
-        bot.answer_callback_query(call.id, f"✅ Рассылка отправлена: {success_count}/{subscribers_count}")
+        bot.answer_callback_query(call.id, "🚀 Рассылка запущена")
 
     def cleanup_mailing_data(bot, mailing_key):
-        """Очистка временных данных рассылки"""
-        if mailing_key in bot.temp_mailing_data:
-            del bot.temp_mailing_data[mailing_key]
+        """Очистка черновика рассылки"""
+        drafts.discard(mailing_key)
 
     @bot.message_handler(commands=['mailing_help'])
     def mailing_help_command(message):
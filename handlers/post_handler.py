@@ -2,15 +2,16 @@ import html
 import re
 from datetime import datetime
 from telebot import types
+from config import DRAFTS_PERSIST
+from utils.draft_store import DraftStore
 from utils.helpers import extract_message_data, format_post_preview
-from config import GROUP_CHAT_ID
 
 
 def setup_post_handlers(bot, db, scheduler):
     """Настройка обработчиков постов в группу"""
 
-    # Временное хранилище для данных постов
-    bot.temp_post_data = {}
+    # Черновики постов до нажатия кнопки (с TTL, лимитом памяти и копией в БД)
+    drafts = DraftStore('post', db if DRAFTS_PERSIST else None)
 
     @bot.message_handler(commands=['post'])
     def post_command(message):
@@ -101,24 +102,24 @@ def setup_post_handlers(bot, db, scheduler):
         )
 
         post_key = f"{sent_message.chat.id}:{sent_message.message_id}"
-        bot.temp_post_data[post_key] = {
+        drafts.put(post_key, {
             'message_text': message_text,
             'image_url': image_url,
             'user_id': message.from_user.id,
             'original_message_id': sent_message.message_id,
             'parse_mode': parse_mode
-        }
+        })
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('post_'))
     def handle_post_callback(call):
         """Обработка нажатий на кнопки постов"""
         post_key = f"{call.message.chat.id}:{call.message.message_id}"
 
-        if post_key not in bot.temp_post_data:
+        post_data = drafts.get(post_key)
+        if post_data is None:
             bot.answer_callback_query(call.id, "❌ Данные поста устарели. Создайте пост заново.")
             return
 
-        post_data = bot.temp_post_data[post_key]
         message_text = post_data['message_text']
         image_url = post_data['image_url']
 
@@ -132,7 +133,7 @@ def setup_post_handlers(bot, db, scheduler):
 
     def handle_schedule_post(call, message_text, image_url, post_key):
         """Обработка кнопки 'Запланировать'"""
-        post_data = bot.temp_post_data[post_key]
+        post_data = drafts.get(post_key) or {}
         parse_mode = post_data.get('parse_mode', 'HTML')
         schedule_help_text = """
 <b>📅 ЗАПЛАНИРОВАТЬ ПОСТ</b>
@@ -155,14 +156,15 @@ def setup_post_handlers(bot, db, scheduler):
             parse_mode='HTML'
         )
 
-        bot.temp_post_data[post_key]['waiting_for_schedule'] = True
+        drafts.update(post_key, waiting_for_schedule=True)
 
         bot.register_next_step_handler_by_chat_id(
             call.message.chat.id,
             process_schedule_time,
             message_text,
             image_url,
-            post_key
+            post_key,
+            parse_mode
         )
 
         bot.answer_callback_query(call.id, "📅 Введите дату и время")
@@ -187,7 +189,8 @@ def setup_post_handlers(bot, db, scheduler):
                 cleanup_post_data(bot, post_key)
                 return
 
-            post_id = db.add_group_post(message.from_user.username, message_text, image_url, scheduled_time.isoformat())
+            post_id = db.add_group_post(message.from_user.username, message_text, image_url,
+                                        scheduled_time.isoformat(), parse_mode)
 
             scheduler.schedule_group_post(post_id, message_text, image_url, scheduled_time,
                                           parse_mode)
@@ -285,40 +288,17 @@ def setup_post_handlers(bot, db, scheduler):
 
     def publish_post_now(bot, message_text, image_url):
         """Мгновенная публикация поста в группу"""
-        try:
-            if image_url:
-
-                result = bot.send_photo(
-                    chat_id=GROUP_CHAT_ID,
-                    photo=image_url,
-                    caption=message_text,
-                    parse_mode='HTML'
-                )
-                print(f"✅ Фото отправлено в группу. Message ID: {result.message_id}")
-            else:
-
-                result = bot.send_message(
-                    chat_id=GROUP_CHAT_ID,
-                    text=message_text,
-                    parse_mode='HTML'
-                )
-                print(f"✅ Текст отправлен в группу. Message ID: {result.message_id}")
-            return True
-        except Exception as e:
-            print(f"❌ Ошибка публикации поста в группу {GROUP_CHAT_ID}: {e}")
-            return False
+        return scheduler.send_to_group(message_text, image_url, 'HTML')
 
     def cleanup_post_data(bot, post_key):
-        """Очистка временных данных поста"""
-        if post_key in bot.temp_post_data:
-            del bot.temp_post_data[post_key]
+        """Очистка черновика поста"""
+        drafts.discard(post_key)
 
     @bot.message_handler(commands=['my_posts'])
     def my_posts_command(message):
         """Мои запланированные посты"""
         user = message.from_user
-        posts = db.get_all_group_posts()
-        user_posts = [p for p in posts if p[1] == user.username and not p[5]]
+        user_posts = db.get_scheduled_group_posts(user.username)
 
         if not user_posts:
             bot.reply_to(message, "📭 <b>У вас нет запланированных постов.</b>", parse_mode='HTML')
@@ -328,7 +308,7 @@ def setup_post_handlers(bot, db, scheduler):
 
         for post in user_posts:
             post_id, author, post_text, image_url, scheduled_time, sent = post
-            preview = format_post_preview(post_text, 50)
+            preview = format_post_preview(post_text, 50, post_id)
             time_str = datetime.fromisoformat(scheduled_time).strftime('%d.%m.%Y %H:%M')
 
             response += f"""
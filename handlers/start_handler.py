@@ -3,14 +3,14 @@ from telebot import types
 from config import GROUP_LINK
 
 
-def setup_start_handlers(bot, db):
+def setup_start_handlers(bot, db, subscriber_buffer):
     """Настройка обработчиков команды /start"""
 
     @bot.message_handler(commands=['start'])
     def start_command(message):
         """Команда /start - подписка на рассылку"""
         user = message.from_user
-        db.add_subscriber(user.id, user.username, user.first_name, user.last_name)
+        subscriber_buffer.add(user.id, user.username, user.first_name, user.last_name)
 
         markup = types.InlineKeyboardMarkup()
         join_button = types.InlineKeyboardButton(
@@ -69,6 +69,8 @@ def setup_start_handlers(bot, db):
 /scheduled - список всех запланированных постов
 /cancel - отменить запланированный пост
 /stats - статистика бота
+/catchup - досылка просроченных постов после запуска
+/profile - профилирование рассылок и команд (on/off)
             """
 
         help_text += """
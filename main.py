@@ -1,8 +1,10 @@
 import logging
 import telebot
-from config import BOT_TOKEN, GROUP_CHAT_ID
+from config import BOT_TOKEN, GROUP_CHAT_ID, DELIVERY_MODE, WEBHOOK_URL, METRICS_PORT
 from database import Database
 from utils.scheduler import SchedulerManager
+from utils.profiling import profiler
+from utils.subscriber_buffer import SubscriberWriteBuffer
 
 
 from handlers.start_handler import setup_start_handlers
@@ -23,15 +25,17 @@ def main():
     logger.info("🚀 Запуск бота...")
 
     try:
-        bot = telebot.TeleBot(BOT_TOKEN)
+        # В режиме webhook обработчики выполняются в пуле WebhookServer
+        bot = telebot.TeleBot(BOT_TOKEN, threaded=not WEBHOOK_URL)
         bot.group_chat_id = GROUP_CHAT_ID  # Добавляем ID группы в объект бота
 
         db = Database()
+        subscriber_buffer = SubscriberWriteBuffer(db)
         scheduler = SchedulerManager(bot, db)
 
         scheduler.restore_scheduled_posts()
 
-        setup_start_handlers(bot, db)
+        setup_start_handlers(bot, db, subscriber_buffer)
         setup_post_handlers(bot, db, scheduler)
         setup_mailing_handlers(bot, db, scheduler)
         setup_admin_handlers(bot, db, scheduler)
@@ -47,17 +51,47 @@ def main():
             """
             bot.reply_to(message, help_text, parse_mode='HTML')
 
-        logger.info("✅ Бот успешно инициализирован")
-        logger.info("🤖 Запускаю опрос сервера...")
+        # Пока профилирование выключено, обертки только проверяют флаг
+        profiler.instrument_handlers(bot)
+
+        if METRICS_PORT:
+            from utils import metrics
+            metrics.instrument_handlers(bot)
+            metrics.instrument_api()
+            metrics.instrument_database(db)
+            metrics_server = metrics.MetricsServer()
+            metrics_server.start()
+
+        # Ответы обработчиков и правки сообщений идут в приоритетной полосе общего лимита.
+        # Подключается после метрик, чтобы время ожидания слота не попадало в задержку Bot API
+        scheduler.rate_controller.route_bot_api()
+
+        logger.info(f"✅ Бот успешно инициализирован (режим доставки: {DELIVERY_MODE})")
 
         # Запуск бота
-        bot.infinity_polling(timeout=60, long_polling_timeout=60)
+        if WEBHOOK_URL:
+            from utils.webhook import WebhookServer
+            webhook_server = WebhookServer(bot)
+            webhook_server.set_webhook()
+            webhook_server.serve_forever()
+        else:
+            logger.info("🤖 Запускаю опрос сервера...")
+            bot.remove_webhook()
+            bot.infinity_polling(timeout=60, long_polling_timeout=60)
 
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}")
     finally:
+        if 'webhook_server' in locals():
+            webhook_server.stop()
+        if 'metrics_server' in locals():
+            metrics_server.stop()
         if 'scheduler' in locals():
             scheduler.shutdown()
+        if 'subscriber_buffer' in locals():
+            subscriber_buffer.close()
+        if 'db' in locals():
+            db.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import BOT_TOKEN, ASYNC_CONCURRENCY
+from utils.payload import BroadcastPayload
+from utils.rate_control import BULK
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBroadcastEngine:
+    """
+    Рассылка через AsyncTeleBot в отдельном event loop.
+    Все запросы идут через одну keep-alive сессию aiohttp.
+    """
+
+    def __init__(self, rate_controller, token=BOT_TOKEN, concurrency=ASYNC_CONCURRENCY, stop_event=None):
+        try:
+            from telebot import asyncio_helper
+            from telebot.async_telebot import AsyncTeleBot
+        except ImportError as e:
+            raise RuntimeError("❌ Для DELIVERY_MODE=async нужен пакет aiohttp (pip install aiohttp)") from e
+
+        # Размер пула соединений общей сессии
+        asyncio_helper.REQUEST_LIMIT = concurrency
+
+        self.concurrency = concurrency
+        self.rate_controller = rate_controller
+        # Установленное событие прекращает выдачу новых получателей (остановка бота)
+        self.stop_event = stop_event or threading.Event()
+
+        # Обработчики результатов (журнал доставки) пишут в SQLite по очереди в отдельном потоке
+        self.callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-delivery-callbacks')
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='async-delivery', daemon=True)
+        self.thread.start()
+        self.bot = AsyncTeleBot(token)
+        logger.info(f"⚡ Асинхронная доставка запущена (до {concurrency} запросов одновременно)")
+
+    def _call(self, coro):
+        """Выполнение корутины в event loop доставки с ожиданием результата"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _send_once(self, chat_id, message_text, image_url, parse_mode):
+        if image_url:
+            return await self.bot.send_photo(
+                chat_id=chat_id,
+                photo=image_url,
+                caption=message_text,
+                parse_mode=parse_mode
+            )
+        return await self.bot.send_message(
+            chat_id=chat_id,
+            text=message_text,
+            parse_mode=parse_mode
+        )
+
+    async def _send(self, chat_id, message_text, image_url=None, parse_mode=None, lane=BULK):
+        return await self.rate_controller.call_async(
+            chat_id,
+            lambda: self._send_once(chat_id, message_text, image_url, parse_mode),
+            lane
+        )
+
+    async def _send_payload(self, chat_id, payload):
+        return await self.rate_controller.call_async(
+            chat_id,
+            lambda: payload.send_async(self.bot.token, chat_id)
+        )
+
+    async def _broadcast(self, chat_ids, message_text, image_url, parse_mode, on_success, on_failure):
+        counters = {'success': 0, 'fail': 0}
+        in_flight = asyncio.Semaphore(self.concurrency)
+        payload = None
+        if BroadcastPayload.supports(image_url):
+            # Тело запроса одинаково для всех, кроме chat_id — кодируем его один раз
+            payload = BroadcastPayload.for_bot(self.bot, message_text, image_url, parse_mode)
+
+        async def deliver(chat_id):
+            try:
+                if payload:
+                    await self._send_payload(chat_id, payload)
+                else:
+                    await self._send(chat_id, message_text, image_url, parse_mode)
+                counters['success'] += 1
+            except Exception as e:
+                logger.error(f"❌ Ошибка отправки пользователю {chat_id}: {e}")
+                counters['fail'] += 1
+                if on_failure:
+                    try:
+                        # Обработчики синхронные (например, запись в БД) — выносим из event loop
+                        await self.loop.run_in_executor(self.callbacks, on_failure, chat_id, e)
+                    except Exception as handler_error:
+                        logger.error(f"❌ Ошибка обработки неудачной отправки {chat_id}: {handler_error}")
+            else:
+                if on_success:
+                    try:
+                        await self.loop.run_in_executor(self.callbacks, on_success, chat_id)
+                    except Exception as handler_error:
+                        logger.error(f"❌ Ошибка обработки успешной отправки {chat_id}: {handler_error}")
+            finally:
+                in_flight.release()
+
+        tasks = set()
+        for chat_id in chat_ids:
+            await in_flight.acquire()
+            if self.stop_event.is_set():
+                in_flight.release()
+                break
+            task = self.loop.create_task(deliver(chat_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        return counters['success'], counters['fail']
+
+    def send(self, chat_id, message_text, image_url=None, parse_mode=None, lane=BULK):
+        """Отправка одного сообщения в полосе lane с соблюдением лимитов"""
+        return self._call(self._send(chat_id, message_text, image_url, parse_mode, lane))
+
+    def broadcast(self, chat_ids, message_text, image_url=None, parse_mode=None,
+                  on_success=None, on_failure=None):
+        """Рассылка одного сообщения всем получателям"""
+        return self._call(self._broadcast(chat_ids, message_text, image_url, parse_mode,
+                                          on_success, on_failure))
+
+    def shutdown(self):
+        """Закрытие HTTP-сессии и остановка event loop"""
+        try:
+            self._call(self.bot.close_session())
+        except Exception as e:
+            logger.error(f"❌ Ошибка закрытия HTTP-сессии: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.callbacks.shutdown()
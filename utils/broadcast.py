@@ -0,0 +1,185 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import BROADCAST_WORKERS
+from utils.delivery_ledger import DeliveryLedger
+from utils.metrics import BROADCAST_MESSAGES, BROADCAST_BACKLOG
+from utils.payload import BroadcastPayload
+from utils.rate_control import BULK
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых пользователю больше нет смысла отправлять рассылки
+UNREACHABLE_ERRORS = (
+    'bot was blocked by the user',
+    'user is deactivated',
+)
+
+
+def is_unreachable(error):
+    """Пользователь заблокировал бота или удалил аккаунт"""
+    if getattr(error, 'error_code', None) not in (None, 403):
+        return False
+    description = str(error).lower()
+    return any(reason in description for reason in UNREACHABLE_ERRORS)
+
+
+class BroadcastRun:
+    """
+    Состояние одной рассылки: счетчики, журнал доставки и недоступные получатели,
+    которые деактивируются одной транзакцией в конце.
+    """
+
+    def __init__(self, db, mailing_id=None, track_metrics=True):
+        self.db = db
+        self.track_metrics = track_metrics
+        self.ledger = DeliveryLedger(db, mailing_id) if mailing_id is not None else None
+        self.success_count = 0
+        self.fail_count = 0
+        self.unreachable = []
+        self.expected = 0
+        self.lock = threading.Lock()
+
+    def expect(self, count):
+        """Количество получателей рассылки для метрики bot_broadcast_backlog"""
+        if not self.track_metrics:
+            return
+        with self.lock:
+            self.expected += count
+        BROADCAST_BACKLOG.inc(amount=count)
+
+    def _processed(self, result):
+        """Учет отправки в метриках, вызывается под self.lock"""
+        if not self.track_metrics:
+            return
+        BROADCAST_MESSAGES.inc(result)
+        if self.expected > 0:
+            self.expected -= 1
+            BROADCAST_BACKLOG.dec()
+
+    def finish(self):
+        """Снятие с backlog получателей, до которых рассылка не дошла"""
+        with self.lock:
+            remaining, self.expected = self.expected, 0
+        if remaining:
+            BROADCAST_BACKLOG.dec(amount=remaining)
+
+    def on_success(self, user_id):
+        with self.lock:
+            self.success_count += 1
+            self._processed('sent')
+        if self.ledger:
+            self.ledger.record_sent(user_id)
+
+    def on_failure(self, user_id, error):
+        with self.lock:
+            self.fail_count += 1
+            self._processed('failed')
+            if is_unreachable(error):
+                self.unreachable.append(user_id)
+        if self.ledger:
+            self.ledger.record_failed(user_id)
+
+    def flush(self):
+        """Сохранение журнала и деактивация недоступных получателей"""
+        if self.ledger:
+            self.ledger.flush()
+        with self.lock:
+            unreachable, self.unreachable = self.unreachable, []
+        if unreachable:
+            self.db.deactivate_subscribers(unreachable)
+            logger.info(f"🗑️ Отключено подписчиков, заблокировавших бота: {len(unreachable)}")
+
+
+class BroadcastEngine:
+    """Параллельная рассылка с пулом воркеров и ограничением скорости"""
+
+    def __init__(self, bot, rate_controller, workers=BROADCAST_WORKERS, stop_event=None):
+        self.bot = bot
+        self.rate_controller = rate_controller
+        self.workers = workers
+        # Установленное событие прекращает выдачу новых получателей (остановка бота)
+        self.stop_event = stop_event or threading.Event()
+
+    def _send_once(self, chat_id, message_text, image_url, parse_mode):
+        if image_url:
+            return self.bot.send_photo(
+                chat_id=chat_id,
+                photo=image_url,
+                caption=message_text,
+                parse_mode=parse_mode
+            )
+        return self.bot.send_message(
+            chat_id=chat_id,
+            text=message_text,
+            parse_mode=parse_mode
+        )
+
+    def send(self, chat_id, message_text, image_url=None, parse_mode=None, lane=BULK):
+        """Отправка одного сообщения в полосе lane с соблюдением лимитов и повтором после 429"""
+        return self.rate_controller.call(
+            chat_id,
+            lambda: self._send_once(chat_id, message_text, image_url, parse_mode),
+            lane
+        )
+
+    def send_payload(self, chat_id, payload):
+        """Отправка заранее сериализованного сообщения с соблюдением лимитов"""
+        return self.rate_controller.call(chat_id, lambda: payload.send(self.bot.token, chat_id))
+
+    def broadcast(self, chat_ids, message_text, image_url=None, parse_mode=None,
+                  on_success=None, on_failure=None):
+        """Рассылка одного сообщения всем получателям"""
+        if BroadcastPayload.supports(image_url):
+            # Тело запроса одинаково для всех, кроме chat_id — кодируем его один раз
+            payload = BroadcastPayload.for_bot(self.bot, message_text, image_url, parse_mode)
+            send = lambda chat_id: self.send_payload(chat_id, payload)
+        else:
+            send = lambda chat_id: self.send(chat_id, message_text, image_url, parse_mode)
+        return self.run(chat_ids, send, on_success, on_failure)
+
+    def run(self, chat_ids, send, on_success=None, on_failure=None):
+        """
+        Отправка send(chat_id) каждому получателю.
+        Возвращает количество успешных и неудачных отправок.
+        """
+        counters = {'success': 0, 'fail': 0}
+        counters_lock = threading.Lock()
+        # Ограничиваем число задач в очереди, чтобы не держать в памяти весь список
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+
+        def deliver(chat_id):
+            try:
+                send(chat_id)
+                with counters_lock:
+                    counters['success'] += 1
+            except Exception as e:
+                logger.error(f"❌ Ошибка отправки пользователю {chat_id}: {e}")
+                with counters_lock:
+                    counters['fail'] += 1
+                if on_failure:
+                    try:
+                        on_failure(chat_id, e)
+                    except Exception as handler_error:
+                        logger.error(f"❌ Ошибка обработки неудачной отправки {chat_id}: {handler_error}")
+            else:
+                if on_success:
+                    try:
+                        on_success(chat_id)
+                    except Exception as handler_error:
+                        logger.error(f"❌ Ошибка обработки успешной отправки {chat_id}: {handler_error}")
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='broadcast') as executor:
+            for chat_id in chat_ids:
+                in_flight.acquire()
+                if self.stop_event.is_set():
+                    in_flight.release()
+                    break
+                executor.submit(deliver, chat_id)
+
+        return counters['success'], counters['fail']
+
+    def shutdown(self):
+        """Синхронному движку нечего освобождать"""
@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import CATCHUP_WORKERS, CATCHUP_ORDER
+
+logger = logging.getLogger(__name__)
+
+# Порядок досылки: сначала самые старые или сначала посты в группу
+ORDERS = {
+    'oldest': lambda item: item.scheduled_time,
+    'group_first': lambda item: (item.kind != 'group', item.scheduled_time),
+}
+
+
+class CatchUpItem:
+    """Просроченный пост в очереди досылки"""
+
+    def __init__(self, kind, post_id, scheduled_time):
+        self.kind = kind
+        self.post_id = post_id
+        self.scheduled_time = scheduled_time
+        self.status = 'pending'
+        self.started_at = None
+        self.finished_at = None
+
+
+class CatchUpExecutor:
+    """
+    Фоновая досылка постов, время которых прошло, пока бот был выключен.
+    Посты отправляются не более чем по workers одновременно, в порядке order,
+    и не задерживают запуск приема обновлений.
+    """
+
+    def __init__(self, scheduler, workers=CATCHUP_WORKERS, order=CATCHUP_ORDER):
+        if order not in ORDERS:
+            raise ValueError(f"CATCHUP_ORDER должен быть одним из: {', '.join(ORDERS)}")
+        self.scheduler = scheduler
+        self.order = order
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='catchup')
+        self.items = []
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def submit(self, items):
+        """Постановка в очередь [(kind, post_id, scheduled_time), ...]"""
+        queued = sorted((CatchUpItem(*item) for item in items), key=ORDERS[self.order])
+        if not queued:
+            return 0
+
+        with self.lock:
+            self.items.extend(queued)
+        # Пул берет задачи в порядке постановки
+        for item in queued:
+            self.futures.append(self.executor.submit(self._run, item))
+        logger.info(f"⏳ Досылка просроченных постов: {len(queued)} в очереди (порядок: {self.order})")
+        return len(queued)
+
+    def _run(self, item):
+        if self.scheduler.stopping.is_set():
+            return
+        item.status = 'running'
+        item.started_at = time.monotonic()
+        try:
+            result = self.scheduler.send_post(item.kind, item.post_id)
+            if self.scheduler.stopping.is_set() and result is None:
+                item.status = 'pending'
+            else:
+                item.status = 'skipped' if result is None else ('done' if result else 'failed')
+        except Exception as e:
+            item.status = 'failed'
+            logger.error(f"❌ Ошибка досылки поста {item.post_id} ({item.kind}): {e}")
+        finally:
+            item.finished_at = time.monotonic()
+
+    def snapshot(self):
+        """Состояние очереди досылки для админов"""
+        with self.lock:
+            items = list(self.items)
+        counts = {status: 0 for status in ('pending', 'running', 'done', 'failed', 'skipped')}
+        for item in items:
+            counts[item.status] += 1
+        return {
+            'total': len(items),
+            'counts': counts,
+            'running': [item for item in items if item.status == 'running'],
+        }
+
+    def wait(self, timeout=None):
+        """Ожидание окончания досылки (для бенчмарков и остановки)"""
+        return not wait(list(self.futures), timeout=timeout).not_done
+
+    def shutdown(self):
+        # Идущая рассылка прерывается через scheduler.stopping, ожидаем уже начатые отправки.
+        # Неотправленные посты останутся просроченными и будут досланы после следующего запуска
+        self.scheduler.stopping.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+from config import DELIVERY_LEDGER_BATCH, DELIVERY_LEDGER_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+
+class DeliveryLedger:
+    """
+    Буфер журнала доставки одной рассылки.
+    Результаты пишутся в БД пачками, чтобы после падения
+    рассылка продолжилась с последней сохраненной точки.
+    """
+
+    def __init__(self, db, mailing_id, batch_size=DELIVERY_LEDGER_BATCH,
+                 flush_interval=DELIVERY_LEDGER_FLUSH_INTERVAL):
+        self.db = db
+        self.mailing_id = mailing_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, user_id, status):
+        with self.lock:
+            self.pending.append((user_id, status))
+            if (len(self.pending) < self.batch_size
+                    and time.monotonic() - self.flushed_at < self.flush_interval):
+                return
+            batch, self.pending = self.pending, []
+            self.flushed_at = time.monotonic()
+            # Пишем под блокировкой, чтобы пачки ложились в БД по порядку
+            self._write(batch)
+
+    def record_sent(self, user_id):
+        self.record(user_id, STATUS_SENT)
+
+    def record_failed(self, user_id):
+        self.record(user_id, STATUS_FAILED)
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.flushed_at = time.monotonic()
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.db.record_deliveries(self.mailing_id, batch)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи журнала доставки рассылки {self.mailing_id}: {e}")
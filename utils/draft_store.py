@@ -0,0 +1,116 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import DRAFT_TTL, DRAFT_MAX_ENTRIES, DRAFT_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять истекшие черновики из памяти и БД, секунд
+PURGE_INTERVAL = 60
+
+
+class DraftStore:
+    """
+    Черновики постов и рассылок, ожидающие нажатия кнопки, по ключу "chat_id:message_id".
+    В памяти — LRU с лимитами на количество и размер, у каждого черновика есть TTL.
+    С db черновик дублируется в SQLite: вытесненный из памяти или переживший
+    перезапуск черновик читается из базы при нажатии кнопки.
+    """
+
+    def __init__(self, kind, db=None, ttl=DRAFT_TTL, max_entries=DRAFT_MAX_ENTRIES, max_bytes=DRAFT_MAX_BYTES):
+        self.kind = kind
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, draft, size)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self.purged_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def put(self, key, draft):
+        data = json.dumps(draft, ensure_ascii=False)
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._store(key, draft, expires_at, len(data.encode()))
+        if self.db is not None:
+            self.db.save_draft(self.kind, key, data, expires_at)
+        self._purge_expired()
+
+    def get(self, key):
+        """Копия черновика или None, если его нет или он истек"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end(key)
+                    return dict(entry[1])
+                self._remove(key)
+
+        if self.db is None:
+            return None
+        row = self.db.get_draft(self.kind, key, now)
+        if row is None:
+            return None
+
+        data, expires_at = row
+        draft = json.loads(data)
+        with self.lock:
+            self._store(key, draft, expires_at, len(data.encode()))
+        return dict(draft)
+
+    def update(self, key, **fields):
+        """Изменение полей черновика, продлевает его TTL"""
+        draft = self.get(key)
+        if draft is None:
+            return None
+        draft.update(fields)
+        self.put(key, draft)
+        return draft
+
+    def discard(self, key):
+        with self.lock:
+            self._remove(key)
+        if self.db is not None:
+            self.db.delete_draft(self.kind, key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _store(self, key, draft, expires_at, size):
+        self._remove(key)
+        self.entries[key] = (expires_at, draft, size)
+        self.size += size
+        # Последний добавленный черновик остается в памяти, даже если он один больше лимита
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def _purge_expired(self):
+        """Удаление истекших черновиков не чаще раза в PURGE_INTERVAL"""
+        if time.monotonic() - self.purged_at < PURGE_INTERVAL:
+            return
+        self.purged_at = time.monotonic()
+
+        now = time.time()
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[0] <= now]:
+                self._remove(key)
+        if self.db is not None:
+            purged = self.db.purge_drafts(now)
+            if purged:
+                logger.info(f"🧹 Удалено брошенных черновиков ({self.kind}): {purged}")
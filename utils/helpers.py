@@ -1,7 +1,7 @@
 import html as html_escape
-import re
 import logging
 from config import ADMIN_USERNAMES
+from utils.message_parser import make_preview, parse_message, preview_cache
 
 logger = logging.getLogger(__name__)
 
@@ -21,175 +21,148 @@ def is_admin(username):
 
 
 def extract_message_data(message):
-    """Извлечение данных из сообщения"""
-    message_text = ""
-    image_url = None
-    parse_mode = None
-
-    if message.reply_to_message:
-        original = message.reply_to_message
-        if original.caption:
-            message_text = original.caption
-        elif original.text:
-            message_text = original.text
-
-        if original.photo:
-            image_url = original.photo[-1].file_id
-    else:
-        message_text = message.text
-
-    message_text = re.sub(r'^/\w+\s*', '', message_text).strip()
-
-    image_match = re.search(r'\[img:(https?://[^\]]+)\]', message_text)
-    if image_match:
-        image_url = image_match.group(1)
-        message_text = re.sub(r'\[img:https?://[^\]]+\]', '', message_text).strip()
-
-    parse_mode = None
-
-    return message_text, image_url, parse_mode
-
-
-def convert_entities_to_html(text, entities):
+    """Извлечение данных из сообщения: (текст, изображение, режим разметки)"""
+    return parse_message(message)
+
+
+# Открывающая и закрывающая разметка для типов entities.
+# Типы без форматирования (mention, hashtag, url и т.п.) выводятся как текст.
+HTML_TAGS = {
+    'bold': ('<b>', '</b>'),
+    'italic': ('<i>', '</i>'),
+    'underline': ('<u>', '</u>'),
+    'strikethrough': ('<s>', '</s>'),
+    'spoiler': ('<tg-spoiler>', '</tg-spoiler>'),
+    'code': ('<code>', '</code>'),
+    'pre': ('<pre>', '</pre>'),
+    'blockquote': ('<blockquote>', '</blockquote>'),
+}
+
+MARKDOWN_TAGS = {
+    'bold': ('**', '**'),
+    'italic': ('_', '_'),
+    'underline': ('<u>', '</u>'),
+    'strikethrough': ('<s>', '</s>'),
+    'spoiler': ('<tg-spoiler>', '</tg-spoiler>'),
+    'code': ('`', '`'),
+    'pre': ('```', '```'),
+}
+
+
+def _entity_markup(entity, markup):
+    """Пара (открытие, закрытие) для entity или None, если форматирования нет"""
+    if markup == 'html':
+        if entity.type == 'text_link':
+            return f'<a href="{html_escape.escape(entity.url or "", quote=True)}">', '</a>'
+        if entity.type == 'text_mention' and entity.user:
+            return f'<a href="tg://user?id={entity.user.id}">', '</a>'
+        if entity.type == 'pre' and getattr(entity, 'language', None):
+            language = html_escape.escape(entity.language, quote=True)
+            return f'<pre><code class="language-{language}">', '</code></pre>'
+        if entity.type == 'custom_emoji' and getattr(entity, 'custom_emoji_id', None):
+            return f'<tg-emoji emoji-id="{entity.custom_emoji_id}">', '</tg-emoji>'
+        return HTML_TAGS.get(entity.type)
+
+    if entity.type == 'text_link':
+        return '[', f']({entity.url})'
+    return MARKDOWN_TAGS.get(entity.type)
+
+
+def render_entities(text, entities, markup='html'):
     """
-    Конвертирует Telegram entities в HTML форматирование
+    Преобразование Telegram entities в HTML или Markdown за один проход.
+    Вложенные entities сохраняются, пересекающиеся разбиваются так,
+    чтобы теги оставались правильно вложенными.
     """
+    if not text:
+        return ''
+    html = markup == 'html'
     if not entities:
-        return html_escape.escape(text)
+        return html_escape.escape(text, quote=False) if html else text
 
-    sorted_entities = sorted(entities, key=lambda x: x.offset, reverse=True)
+    # Смещения Telegram считаются в UTF-16 code units: эмодзи вне BMP занимают
+    # две единицы и один символ Python. Если таких символов нет, режем строку напрямую.
+    encoded = text.encode('utf-16-le')
+    text_length = len(encoded) // 2
+    bmp = text_length == len(text)
+    escape = html and ('<' in text or '>' in text or '&' in text)
 
-    result = text
-
-    for entity in sorted_entities:
+    spans = []
+    for order, entity in enumerate(entities):
         start = entity.offset
         end = entity.offset + entity.length
-
-        if start >= len(result) or end > len(result):
+        if entity.length <= 0 or start < 0 or end > text_length:
             continue
+        tags = _entity_markup(entity, markup)
+        if tags:
+            spans.append((start, end, order, tags))
+
+    # Внешние entities открываются раньше вложенных
+    spans.sort(key=lambda span: (span[0], -span[1], span[2]))
+    ends = {span[1] for span in spans}
+    boundaries = sorted({span[0] for span in spans} | ends | {text_length})
+
+    parts = []
+    append = parts.append
+    stack = []
+    next_span = 0
+    previous = 0
+    for boundary in boundaries:
+        if boundary != previous:
+            if bmp:
+                chunk = text[previous:boundary]
+            else:
+                chunk = encoded[previous * 2:boundary * 2].decode('utf-16-le', 'replace')
+            append(html_escape.escape(chunk, quote=False) if escape else chunk)
+            previous = boundary
+
+        if stack and boundary in ends:
+            # Закрываем entities, которые кончаются здесь, вместе со всеми вложенными в них;
+            # вложенные, которые продолжаются дальше, открываются заново
+            for first, span in enumerate(stack):
+                if span[1] == boundary:
+                    break
+            closing = stack[first:]
+            del stack[first:]
+            for span in reversed(closing):
+                append(span[3][1])
+            for span in closing:
+                if span[1] != boundary:
+                    append(span[3][0])
+                    stack.append(span)
+
+        while next_span < len(spans) and spans[next_span][0] == boundary:
+            span = spans[next_span]
+            append(span[3][0])
+            stack.append(span)
+            next_span += 1
+
+    return ''.join(parts)
 
-        entity_text = result[start:end]
-
-        if entity.type == "bold":
-            replacement = f"<b>{html_escape.escape(entity_text)}</b>"
-        elif entity.type == "italic":
-            replacement = f"<i>{html_escape.escape(entity_text)}</i>"
-        elif entity.type == "underline":
-            replacement = f"<u>{html_escape.escape(entity_text)}</u>"
-        elif entity.type == "strikethrough":
-            replacement = f"<s>{html_escape.escape(entity_text)}</s>"
-        elif entity.type == "code":
-            replacement = f"<code>{html_escape.escape(entity_text)}</code>"
-        elif entity.type == "pre":
-            replacement = f"<pre>{html_escape.escape(entity_text)}</pre>"
-        elif entity.type == "text_link":
-            replacement = f'<a href="{entity.url}">{html_escape.escape(entity_text)}</a>'
-        elif entity.type == "spoiler":
-            replacement = f'<tg-spoiler>{html_escape.escape(entity_text)}</tg-spoiler>'
-        else:
-            replacement = html_escape.escape(entity_text)
-
-        result = result[:start] + replacement + result[end:]
 
-    return result
+def convert_entities_to_html(text, entities):
+    """
+    Конвертирует Telegram entities в HTML форматирование
+    """
+    return render_entities(text, entities, 'html')
 
 
 def convert_entities_safe(text, entities):
     """
     Безопасная конвертация entities с сохранением ссылок
     """
-    safe_text = html_escape.escape(text)
-
-    sorted_entities = sorted(entities, key=lambda x: x.offset, reverse=True)
-
-    result = safe_text
-
-    for entity in sorted_entities:
-        start = entity.offset
-        end = entity.offset + entity.length
-
-        if start >= len(result) or end > len(result):
-            continue
-
-        entity_text = text[start:end]
-
-        if entity.type == "bold":
-            replacement = f"<b>{html_escape.escape(entity_text)}</b>"
-        elif entity.type == "italic":
-            replacement = f"<i>{html_escape.escape(entity_text)}</i>"
-        elif entity.type == "underline":
-            replacement = f"<u>{html_escape.escape(entity_text)}</u>"
-        elif entity.type == "strikethrough":
-            replacement = f"<s>{html_escape.escape(entity_text)}</s>"
-        elif entity.type == "code":
-            replacement = f"<code>{html_escape.escape(entity_text)}</code>"
-        elif entity.type == "pre":
-            replacement = f"<pre>{html_escape.escape(entity_text)}</pre>"
-        elif entity.type == "text_link":
-            # Для ссылок используем HTML теги
-            replacement = f'<a href="{entity.url}">{html_escape.escape(entity_text)}</a>'
-        elif entity.type == "spoiler":
-            replacement = f'<tg-spoiler>{html_escape.escape(entity_text)}</tg-spoiler>'
-        else:
-            replacement = html_escape.escape(entity_text)
-
-        result = result[:start] + replacement + result[end:]
-
-    return result
+    return render_entities(text, entities, 'html')
 
 
 def convert_entities_to_markdown(text, entities):
     """
     Конвертирует Telegram entities в Markdown форматирование
     """
-    if not entities:
-        return text
-
-    sorted_entities = sorted(entities, key=lambda x: x.offset, reverse=True)
-    result = text
-
-    for entity in sorted_entities:
-        start = entity.offset
-        end = entity.offset + entity.length
-
-        if start >= len(result) or end > len(result):
-            continue
-
-        entity_text = result[start:end]
-
-        if entity.type == "bold":
-            replacement = f"**{entity_text}**"
-        elif entity.type == "italic":
-            replacement = f"_{entity_text}_"
-        elif entity.type == "code":
-            replacement = f"`{entity_text}`"
-        elif entity.type == "pre":
-            replacement = f"```{entity_text}```"
-        elif entity.type == "text_link":
-            replacement = f"[{entity_text}]({entity.url})"
-        else:
-            if entity.type == "underline":
-                replacement = f"<u>{entity_text}</u>"
-            elif entity.type == "strikethrough":
-                replacement = f"<s>{entity_text}</s>"
-            elif entity.type == "spoiler":
-                replacement = f"<tg-spoiler>{entity_text}</tg-spoiler>"
-            else:
-                replacement = entity_text
-
-        result = result[:start] + replacement + result[end:]
-
-    return result
-
-
-def format_post_preview(text, max_length=100):
-    """Форматирование превью поста"""
-    if not text:
-        return "🖼️ Сообщение с изображением"
-
-    clean_text = re.sub(r'<[^>]+>', '', text)
+    return render_entities(text, entities, 'markdown')
 
-    if len(clean_text) > max_length:
-        return clean_text[:max_length] + "..."
 
-    return clean_text
\ No newline at end of file
+def format_post_preview(text, max_length=100, post_id=None, kind='group'):
+    """Форматирование превью поста (для сохраненных постов — через кэш по post_id)"""
+    if post_id is not None:
+        return preview_cache.get(kind, post_id, text, max_length)
+    return make_preview(text, max_length)
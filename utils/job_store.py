@@ -0,0 +1,110 @@
+import logging
+import pickle
+import sqlite3
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteJobStore(BaseJobStore):
+    """
+    Хранилище задач APScheduler в таблице scheduler_jobs основной базы бота.
+    Задачи читаются только когда подходит их время, поэтому запуск планировщика
+    не зависит от количества запланированных постов.
+    """
+
+    def __init__(self, db, pickle_protocol=pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.db = db
+        self.pickle_protocol = pickle_protocol
+
+    def lookup_job(self, job_id):
+        row = self.db.get_connection().execute(
+            'SELECT job_state FROM scheduler_jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        return self._reconstitute_job(row[0]) if row else None
+
+    def get_due_jobs(self, now):
+        return self._get_jobs('WHERE next_run_time <= ?', (datetime_to_utc_timestamp(now),))
+
+    def get_next_run_time(self):
+        row = self.db.get_connection().execute('''
+            SELECT next_run_time FROM scheduler_jobs
+            WHERE next_run_time IS NOT NULL
+            ORDER BY next_run_time LIMIT 1
+        ''').fetchone()
+        return utc_timestamp_to_datetime(row[0]) if row else None
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job):
+        conn = self.db.get_connection()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT INTO scheduler_jobs (id, next_run_time, job_state) VALUES (?, ?, ?)',
+                    (job.id, datetime_to_utc_timestamp(job.next_run_time), self._dump(job))
+                )
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id)
+
+    def update_job(self, job):
+        conn = self.db.get_connection()
+        with conn:
+            cursor = conn.execute(
+                'UPDATE scheduler_jobs SET next_run_time = ?, job_state = ? WHERE id = ?',
+                (datetime_to_utc_timestamp(job.next_run_time), self._dump(job), job.id)
+            )
+        if cursor.rowcount == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        conn = self.db.get_connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM scheduler_jobs WHERE id = ?', (job_id,))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        conn = self.db.get_connection()
+        with conn:
+            conn.execute('DELETE FROM scheduler_jobs')
+
+    def _dump(self, job):
+        return pickle.dumps(job.__getstate__(), self.pickle_protocol)
+
+    def _reconstitute_job(self, job_state):
+        job_state = pickle.loads(job_state)
+        job_state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, condition='', params=()):
+        jobs = []
+        failed_job_ids = []
+        rows = self.db.get_connection().execute(
+            f'SELECT id, job_state FROM scheduler_jobs {condition} ORDER BY next_run_time', params
+        ).fetchall()
+        for job_id, job_state in rows:
+            try:
+                jobs.append(self._reconstitute_job(job_state))
+            except Exception:
+                logger.exception(f"❌ Не удалось восстановить задачу {job_id}, она будет удалена")
+                failed_job_ids.append(job_id)
+
+        if failed_job_ids:
+            conn = self.db.get_connection()
+            with conn:
+                conn.executemany('DELETE FROM scheduler_jobs WHERE id = ?', [(job_id,) for job_id in failed_job_ids])
+        return jobs
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} (path={self.db.db_path})>'
@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import urllib.request
+from config import (MEDIA_CACHE_MAX_ENTRIES, MEDIA_CACHE_TTL_DAYS, MEDIA_DOWNLOAD_TIMEOUT,
+                    MEDIA_MAX_BYTES)
+
+logger = logging.getLogger(__name__)
+
+
+def is_remote(photo):
+    """Изображение задано ссылкой [img:...], а не file_id Telegram"""
+    return isinstance(photo, str) and photo.startswith(('http://', 'https://'))
+
+
+class MediaCache:
+    """
+    Кэш file_id изображений, заданных по URL.
+    Картинка скачивается и загружается в Telegram один раз,
+    дальше во всех отправках используется file_id из первого ответа.
+    """
+
+    def __init__(self, db, max_entries=MEDIA_CACHE_MAX_ENTRIES, ttl_days=MEDIA_CACHE_TTL_DAYS):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl_days = ttl_days
+
+    def resolve(self, image_url):
+        """
+        Возвращает (photo, content_hash): file_id из кэша, байты для первой загрузки
+        или исходное значение, если кэш неприменим.
+        """
+        if not is_remote(image_url):
+            return image_url, None
+
+        file_id = self.db.get_media_file_id(url=image_url)
+        if file_id:
+            logger.info(f"🗂️ Изображение из кэша: {image_url}")
+            return file_id, None
+
+        data = self._download(image_url)
+        if data is None:
+            return image_url, None
+
+        content_hash = hashlib.sha256(data).hexdigest()
+        file_id = self.db.get_media_file_id(content_hash=content_hash)
+        if file_id:
+            # Та же картинка по другой ссылке
+            self.db.save_media_file_id(image_url, content_hash, file_id)
+            return file_id, content_hash
+
+        return data, content_hash
+
+    def remember(self, image_url, content_hash, message):
+        """Сохранение file_id из ответа на первую успешную отправку"""
+        if not is_remote(image_url) or not getattr(message, 'photo', None):
+            return None
+
+        file_id = message.photo[-1].file_id
+        try:
+            self.db.save_media_file_id(image_url, content_hash, file_id)
+            self.db.evict_media_cache(self.max_entries, self.ttl_days)
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения изображения в кэш: {e}")
+        return file_id
+
+    def _download(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=MEDIA_DOWNLOAD_TIMEOUT) as response:
+                data = response.read(MEDIA_MAX_BYTES + 1)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось скачать изображение {url}: {e}")
+            return None
+
+        if len(data) > MEDIA_MAX_BYTES:
+            logger.warning(f"⚠️ Изображение {url} больше {MEDIA_MAX_BYTES} байт, отправляю ссылкой")
+            return None
+        return data
@@ -0,0 +1,106 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from config import PREVIEW_CACHE_SIZE
+
+# Шаблоны компилируются один раз при импорте
+COMMAND_PATTERN = re.compile(r'^/\w+\s*')
+IMAGE_PATTERN = re.compile(r'\[img:(https?://[^\]]+)\]')
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+EMPTY_PREVIEW = "🖼️ Сообщение с изображением"
+
+
+class ParsedPost(NamedTuple):
+    """Разобранное сообщение: текст без команды и [img:...], изображение и режим разметки"""
+    text: str
+    image_url: Optional[str]
+    parse_mode: Optional[str]
+
+    def preview(self, max_length=100):
+        return make_preview(self.text, max_length)
+
+
+def parse_text(text, image_url=None):
+    """Разбор текста команды: отрезает /команду и вынимает ссылку [img:...]"""
+    text = COMMAND_PATTERN.sub('', text or '', count=1).strip()
+
+    image_match = IMAGE_PATTERN.search(text)
+    if image_match:
+        image_url = image_match.group(1)
+        text = IMAGE_PATTERN.sub('', text).strip()
+
+    return ParsedPost(text, image_url, None)
+
+
+def parse_message(message):
+    """Разбор сообщения с командой или ответа командой на сообщение/фото"""
+    image_url = None
+
+    if message.reply_to_message:
+        original = message.reply_to_message
+        text = original.caption or original.text or ""
+        if original.photo:
+            image_url = original.photo[-1].file_id
+    else:
+        text = message.text
+
+    return parse_text(text, image_url)
+
+
+def make_preview(text, max_length=100):
+    """Короткое превью текста без HTML-тегов"""
+    if not text:
+        return EMPTY_PREVIEW
+
+    clean_text = TAG_PATTERN.sub('', text)
+
+    if len(clean_text) > max_length:
+        return clean_text[:max_length] + "..."
+
+    return clean_text
+
+
+class PreviewCache:
+    """
+    LRU-кэш превью сохраненных постов.
+    Текст поста после сохранения не меняется, поэтому ключа (тип, id, длина) достаточно.
+    """
+
+    def __init__(self, max_entries=PREVIEW_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, post_id, text, max_length=100):
+        key = (kind, post_id, max_length)
+        with self.lock:
+            preview = self.entries.get(key)
+            if preview is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return preview
+            self.misses += 1
+
+        preview = make_preview(text, max_length)
+        with self.lock:
+            self.entries[key] = preview
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return preview
+
+    def invalidate(self, kind, post_id):
+        """Удаление превью поста (после отмены или удаления)"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == kind and key[1] == post_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+preview_cache = PreviewCache()
@@ -0,0 +1,395 @@
+import bisect
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_LISTEN, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунд (как у клиентов Prometheus по умолчанию)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Общая часть метрик: имя, описание, метки и значения по набору меток"""
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            lines.extend(self._render_value(label_values, value))
+        return lines
+
+    def _render_value(self, label_values, value):
+        return [f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *label_values):
+        with self.lock:
+            self.values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                # [количество в каждой корзине, сумма]
+                state = self.values[label_values] = [[0] * len(self.buckets), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, *label_values):
+        """Контекстный менеджер, замеряющий длительность блока"""
+        return _Timer(self, label_values)
+
+    def _render_value(self, label_values, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.labels, label_values, [('le', _format_value(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f'{self.name}_sum{labels} {total!r}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+class Registry:
+    """Набор метрик процесса, отдаваемый в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    'bot_handler_duration_seconds', 'Время выполнения обработчика обновления', ('handler',))
+HANDLER_ERRORS = REGISTRY.counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках обновлений', ('handler',))
+API_LATENCY = REGISTRY.histogram(
+    'bot_api_request_duration_seconds', 'Время запроса к Bot API', ('method',))
+API_RESPONSES = REGISTRY.counter(
+    'bot_api_responses_total', 'Ответы Bot API по методу и коду (error — сетевая ошибка)', ('method', 'code'))
+DB_LATENCY = REGISTRY.histogram(
+    'bot_db_query_duration_seconds', 'Время выполнения метода Database', ('query',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+BROADCAST_MESSAGES = REGISTRY.counter(
+    'bot_broadcast_messages_total', 'Сообщения рассылок по результату', ('result',))
+BROADCAST_BACKLOG = REGISTRY.gauge(
+    'bot_broadcast_backlog', 'Получатели текущих рассылок, которым сообщение еще не отправлено')
+OUTBOUND_REQUESTS = REGISTRY.counter(
+    'bot_outbound_requests_total', 'Исходящие запросы по полосе и результату (throttled — повтор после 429)',
+    ('lane', 'result'))
+OUTBOUND_WAIT = REGISTRY.histogram(
+    'bot_outbound_wait_seconds', 'Ожидание слота отправки в полосе', ('lane',))
+OUTBOUND_WAITING = REGISTRY.gauge(
+    'bot_outbound_waiting', 'Запросы, ожидающие слота отправки', ('lane',))
+
+
+def observe_api_call(method, start, error=None):
+    """Запись задержки и кода ответа одного запроса к Bot API"""
+    API_LATENCY.observe(time.perf_counter() - start, method)
+    if error is None:
+        code = 200
+    else:
+        code = getattr(error, 'error_code', None) or 'error'
+    API_RESPONSES.inc(method, str(code))
+
+
+def instrument_handlers(bot):
+    """Замер времени всех зарегистрированных обработчиков бота"""
+    handler_lists = [value for name, value in vars(bot).items() if name.endswith('_handlers')]
+    for handlers in handler_lists:
+        for handler in handlers if isinstance(handlers, list) else ():
+            if isinstance(handler, dict) and not getattr(handler.get('function'), 'metrics_timed', False):
+                handler['function'] = _timed_handler(handler['function'])
+
+
+def _timed_handler(function):
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+
+    wrapper.metrics_timed = True
+    return wrapper
+
+
+def instrument_api():
+    """
+    Замер всех запросов к Bot API: через TeleBot (apihelper._make_request),
+    AsyncTeleBot (asyncio_helper._process_request) и BroadcastPayload.
+    """
+    from telebot import apihelper
+    from utils.payload import BroadcastPayload
+
+    make_request = apihelper._make_request
+    if getattr(make_request, 'metrics_timed', False):
+        return
+
+    @functools.wraps(make_request)
+    def timed_make_request(token, method_name, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = make_request(token, method_name, *args, **kwargs)
+        except Exception as e:
+            observe_api_call(method_name, start, e)
+            raise
+        observe_api_call(method_name, start)
+        return result
+
+    timed_make_request.metrics_timed = True
+    apihelper._make_request = timed_make_request
+
+    payload_send = BroadcastPayload.send
+
+    @functools.wraps(payload_send)
+    def timed_payload_send(payload, token, chat_id):
+        start = time.perf_counter()
+        try:
+            result = payload_send(payload, token, chat_id)
+        except Exception as e:
+            observe_api_call(payload.method, start, e)
+            raise
+        observe_api_call(payload.method, start)
+        return result
+
+    BroadcastPayload.send = timed_payload_send
+
+    payload_send_async = BroadcastPayload.send_async
+
+    @functools.wraps(payload_send_async)
+    async def timed_payload_send_async(payload, token, chat_id):
+        start = time.perf_counter()
+        try:
+            result = await payload_send_async(payload, token, chat_id)
+        except Exception as e:
+            observe_api_call(payload.method, start, e)
+            raise
+        observe_api_call(payload.method, start)
+        return result
+
+    BroadcastPayload.send_async = timed_payload_send_async
+
+    try:
+        from telebot import asyncio_helper
+    except ImportError:
+        # Без aiohttp асинхронный режим недоступен
+        return
+
+    process_request = asyncio_helper._process_request
+
+    @functools.wraps(process_request)
+    async def timed_process_request(token, url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await process_request(token, url, *args, **kwargs)
+        except Exception as e:
+            observe_api_call(url, start, e)
+            raise
+        observe_api_call(url, start)
+        return result
+
+    asyncio_helper._process_request = timed_process_request
+
+
+# Методы Database, которые не выполняют запросы к данным
+NOT_QUERIES = ('get_connection', 'init_db', 'close')
+
+
+def instrument_database(db):
+    """Замер времени публичных методов Database этого экземпляра"""
+    for name, method in inspect.getmembers(db, inspect.ismethod):
+        if name.startswith('_') or name in NOT_QUERIES:
+            continue
+        if inspect.isgeneratorfunction(method):
+            setattr(db, name, _timed_generator(name, method))
+        else:
+            setattr(db, name, _timed_method(name, method))
+
+
+def _timed_method(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with DB_LATENCY.time(name):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def _timed_generator(name, method):
+    """Для генераторов (iter_subscribers) считается суммарное время внутри генератора"""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        iterator = method(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            iterator.close()
+            DB_LATENCY.observe(elapsed, name)
+
+    return wrapper
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics в текстовом формате Prometheus"""
+
+    def __init__(self, registry=REGISTRY, listen=METRICS_LISTEN, port=METRICS_PORT):
+        self.registry = registry
+        self.httpd = ThreadingHTTPServer((listen, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True)
+        self.thread.start()
+        logger.info(f"📈 Метрики доступны на http://{self.httpd.server_address[0]}:{self.port}/metrics")
+        return self.thread
+
+    def stop(self):
+        if self.thread is not None:
+            self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,97 @@
+from urllib.parse import urlencode
+import requests
+from telebot import apihelper
+
+FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def api_url(token, method):
+    """Адрес метода Bot API с учетом apihelper.API_URL"""
+    return (apihelper.API_URL or 'https://api.telegram.org/bot{0}/{1}').format(token, method)
+
+
+class BroadcastPayload:
+    """
+    Сообщение рассылки, сериализованное один раз.
+    Тело запроса (текст, подпись, parse_mode) кодируется при создании, на каждого
+    получателя к нему только дописывается chat_id.
+    """
+
+    def __init__(self, message_text, photo=None, parse_mode=None, **options):
+        if photo:
+            self.method = 'sendPhoto'
+            params = {'photo': photo, 'caption': message_text}
+        else:
+            self.method = 'sendMessage'
+            params = {'text': message_text}
+        if parse_mode:
+            params['parse_mode'] = parse_mode
+        for name, value in options.items():
+            if value is not None:
+                params[name] = str(value).lower() if isinstance(value, bool) else value
+
+        self.suffix = ('&' + urlencode(params)).encode()
+        self.templates = {}
+
+    @classmethod
+    def for_bot(cls, bot, message_text, photo=None, parse_mode=None):
+        """Payload с теми же умолчаниями, что применил бы bot.send_message/send_photo"""
+        options = {
+            'disable_notification': bot.disable_notification,
+            'protect_content': bot.protect_content,
+        }
+        if not photo:
+            options['disable_web_page_preview'] = bot.disable_web_page_preview
+        return cls(message_text, photo, bot.parse_mode if parse_mode is None else parse_mode, **options)
+
+    @staticmethod
+    def supports(photo):
+        """Заранее сериализовать можно текст, file_id и ссылку, но не загрузку файла"""
+        return photo is None or isinstance(photo, str)
+
+    def _template(self, token, session):
+        """
+        Подготовленный запрос и настройки отправки, собранные один раз.
+        Session.request на каждый вызов заново разбирает URL и перебирает os.environ
+        в поисках прокси — здесь это делается только при первой отправке.
+        """
+        key = (apihelper.API_URL, token)
+        template = self.templates.get(key)
+        if template is None:
+            url = api_url(token, self.method)
+            prepared = session.prepare_request(requests.Request('POST', url, headers=FORM_HEADERS, data=b'-'))
+            settings = session.merge_environment_settings(url, apihelper.proxy or {}, None, None, None)
+            template = self.templates[key] = (prepared, settings)
+        return template
+
+    def body(self, chat_id):
+        return b'chat_id=' + str(chat_id).encode() + self.suffix
+
+    def send(self, token, chat_id):
+        """
+        Отправка через сессию requests текущего потока, ту же, что у TeleBot.
+        Возвращает result из ответа без разбора в объект Message.
+        """
+        session = apihelper._get_req_session()
+        template, settings = self._template(token, session)
+        request = template.copy()
+        request.body = self.body(chat_id)
+        request.headers['Content-Length'] = str(len(request.body))
+        response = session.send(request, timeout=(apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT), **settings)
+        return apihelper._check_result(self.method, response)['result']
+
+    async def send_async(self, token, chat_id):
+        """Отправка через общую aiohttp-сессию AsyncTeleBot"""
+        import aiohttp
+        from telebot import asyncio_helper
+
+        session = await asyncio_helper.session_manager.get_session()
+        async with session.post(
+            asyncio_helper.API_URL.format(token, self.method),
+            data=self.body(chat_id),
+            headers=FORM_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=asyncio_helper.REQUEST_TIMEOUT),
+            proxy=asyncio_helper.proxy,
+        ) as response:
+            result_json = await asyncio_helper._check_result(self.method, response)
+        return result_json['result']
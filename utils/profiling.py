@@ -0,0 +1,190 @@
+import cProfile
+import functools
+import io
+import itertools
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from config import PROFILE_ENABLED, PROFILE_DIR, PROFILE_TOP, PROFILE_SAMPLE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# cProfile может работать только в одном потоке одновременно
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """
+    Сэмплирующий профилировщик всех потоков процесса.
+    cProfile видит только свой поток, а рассылка идет в пуле потоков или в цикле
+    asyncio, поэтому для нее стеки всех потоков снимаются раз в interval секунд.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_firstlineno}:{code.co_name}')
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path, label, top):
+        """Свернутые стеки (.folded, для flamegraph) и сводка самых горячих функций (.txt)"""
+        with open(path + '.folded', 'w') as folded:
+            for stack, count in self.stacks.most_common():
+                folded.write(f"{';'.join(stack)} {count}\n")
+
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            # stack[0] — имя потока
+            own[stack[-1]] += count
+            for function in set(stack[1:]):
+                total[function] += count
+
+        frames = sum(self.stacks.values()) or 1
+        lines = [f"Профиль {label}: {self.elapsed:.2f} с, {self.samples} выборок по {self.interval * 1000:.0f} мс, "
+                 f"{frames} стеков потоков", '', 'Собственное время:']
+        lines += [f"  {count / frames:6.1%}  {count:>7}  {function}" for function, count in own.most_common(top)]
+        lines += ['', 'С учетом вызванных функций:']
+        lines += [f"  {count / frames:6.1%}  {count:>7}  {function}" for function, count in total.most_common(top)]
+        with open(path + '.txt', 'w') as summary:
+            summary.write('\n'.join(lines) + '\n')
+
+
+class Profiler:
+    """
+    Профилирование рассылок, задач планировщика и обработчиков по запросу.
+    Включается через PROFILE_ENABLED или командой /profile; пока выключено,
+    обертки только проверяют флаг. Каждый запуск пишет файлы в PROFILE_DIR.
+    """
+
+    def __init__(self, enabled=PROFILE_ENABLED, directory=PROFILE_DIR, top=PROFILE_TOP):
+        self.enabled = enabled
+        self.directory = directory
+        self.top = top
+        self.runs = itertools.count(1)
+        self.local = threading.local()
+
+    def run(self, label, func, *args, sample=False, **kwargs):
+        """
+        Вызов func(*args, **kwargs) под профилировщиком.
+        sample=True — сэмплирование всех потоков, иначе cProfile текущего потока.
+        Вложенный вызов того же вида в уже профилируемом потоке отдельно не профилируется,
+        как и вызов cProfile, пока он работает в другом потоке.
+        Ошибки профилирования пишутся в лог и не прерывают func.
+        """
+        if not self.enabled:
+            return func(*args, **kwargs)
+        mode = 'sample' if sample else 'cprofile'
+        active = self.local.__dict__.setdefault('modes', set())
+        if mode in active:
+            return func(*args, **kwargs)
+        # С Python 3.12 второй одновременно включенный cProfile падает с ValueError
+        if not sample and not _cprofile_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+
+        active.add(mode)
+        profiler = None
+        try:
+            path = self._path(label)
+            if sample:
+                profiler = StackSampler()
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except Exception as e:
+            profiler = None
+            logger.error(f"❌ Не удалось запустить профилирование {label}: {e}")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            try:
+                if profiler is not None:
+                    if sample:
+                        profiler.stop()
+                    else:
+                        profiler.disable()
+                    self._write(profiler, path, label)
+            except Exception as e:
+                logger.error(f"❌ Не удалось сохранить профиль {label}: {e}")
+            finally:
+                active.discard(mode)
+                if not sample:
+                    _cprofile_lock.release()
+
+    def _path(self, label):
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', label)
+        return os.path.join(self.directory, f"{datetime.now():%Y%m%d-%H%M%S}-{next(self.runs):04d}-{name}")
+
+    def _write(self, profiler, path, label):
+        if isinstance(profiler, StackSampler):
+            profiler.write(path, label, self.top)
+            logger.info(f"🔬 Профиль {label} сохранен: {path}.folded, {path}.txt")
+            return
+
+        profiler.dump_stats(path + '.prof')
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        summary.write(f"Профиль {label}: {stats.total_tt:.3f} с, {stats.total_calls} вызовов\n")
+        stats.sort_stats('cumulative').print_stats(self.top)
+        stats.sort_stats('tottime').print_stats(self.top)
+        with open(path + '.txt', 'w') as file:
+            file.write(summary.getvalue())
+        logger.info(f"🔬 Профиль {label} сохранен: {path}.prof, {path}.txt")
+
+    def profiled(self, label, sample=False):
+        """Декоратор: профилирование каждого вызова функции под именем label"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                return self.run(label, func, *args, sample=sample, **kwargs)
+            return wrapper
+        return decorator
+
+    def instrument_handlers(self, bot):
+        """Профилирование всех зарегистрированных обработчиков бота (cProfile, по имени функции)"""
+        for name, handlers in vars(bot).items():
+            if not name.endswith('_handlers') or not isinstance(handlers, list):
+                continue
+            for handler in handlers:
+                if isinstance(handler, dict) and 'function' in handler:
+                    function = handler['function']
+                    handler['function'] = self.profiled(f"handler-{function.__name__}")(function)
+
+
+profiler = Profiler()
@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from config import PROGRESS_EDIT_INTERVAL
+from utils.rate_control import get_retry_after
+
+logger = logging.getLogger(__name__)
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "—"
+    return str(timedelta(seconds=int(seconds)))
+
+
+class BroadcastProgress:
+    """
+    Живой отчет о рассылке в сообщении админа.
+    Отдельный поток раз в interval секунд читает счетчики BroadcastRun и
+    редактирует сообщение, поэтому отправка подписчикам не ждет Telegram,
+    а на отчет уходит не больше одного запроса за interval.
+    """
+
+    def __init__(self, bot, chat_id, message_id, mailing_id=None, interval=PROGRESS_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.mailing_id = mailing_id
+        self.interval = interval
+        self.run = None
+        self.total = 0
+        self.started_at = None
+        self.last_text = None
+        self.paused_until = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self, run, total):
+        """Начало рассылки: run — BroadcastRun, total — получателей"""
+        self.run = run
+        self.total = total
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._report, name='broadcast-progress', daemon=True)
+        self.thread.start()
+
+    def _report(self):
+        processed_before, measured_at = self._processed(), time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            processed, now = self._processed(), time.monotonic()
+            rate = (processed - processed_before) / (now - measured_at)
+            processed_before, measured_at = processed, now
+            self._edit(self.render(rate))
+
+    def _processed(self):
+        return self.run.success_count + self.run.fail_count
+
+    def render(self, rate):
+        sent, failed = self.run.success_count, self.run.fail_count
+        remaining = max(0, self.total - sent - failed)
+        eta = remaining / rate if rate > 0 else None
+        title = f"Рассылка ID:{self.mailing_id}" if self.mailing_id is not None else "Рассылка"
+        return f"""
+📤 <b>{title} идет...</b>
+
+✅ <b>Отправлено:</b> {sent}
+❌ <b>Не доставлено:</b> {failed}
+⏳ <b>Осталось:</b> {remaining}
+🚀 <b>Скорость:</b> {rate:.1f} сообщ/с
+🕒 <b>До окончания:</b> {format_eta(eta)}
+        """
+
+    def render_report(self):
+        sent, failed = self.run.success_count, self.run.fail_count
+        elapsed = time.monotonic() - self.started_at
+        return f"""
+<b>📊 Отчет о рассылке:</b>
+
+✅ <b>Успешно доставлено:</b> {sent}
+❌ <b>Не доставлено:</b> {failed}
+👥 <b>Всего получателей:</b> {self.total}
+🕒 <b>Время рассылки:</b> {format_eta(elapsed)}
+
+💫 <b>Эффективность:</b> {(sent / self.total * 100) if self.total > 0 else 0:.1f}%
+        """
+
+    def render_interrupted(self):
+        sent, failed = self.run.success_count, self.run.fail_count
+        title = f"Рассылка ID:{self.mailing_id}" if self.mailing_id is not None else "Рассылка"
+        return f"""
+⏸️ <b>{title} прервана остановкой бота</b>
+
+✅ <b>Отправлено:</b> {sent}
+❌ <b>Не доставлено:</b> {failed}
+⏳ <b>Осталось:</b> {max(0, self.total - sent - failed)}
+
+Рассылка будет продолжена после запуска бота.
+        """
+
+    def finish(self, interrupted=False):
+        """Остановка живого отчета и итоговое сообщение (interrupted — рассылку прервала остановка бота)"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.paused_until = 0.0
+            self._edit(self.render_interrupted() if interrupted else self.render_report())
+
+    def _edit(self, text):
+        # Повторный текст и ожидание после 429 не тратят запросы
+        if text == self.last_text or time.monotonic() < self.paused_until:
+            return
+        try:
+            self.bot.edit_message_text(text, self.chat_id, self.message_id, parse_mode='HTML')
+            self.last_text = text
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                self.paused_until = time.monotonic() + retry_after
+            logger.warning(f"⚠️ Не удалось обновить отчет о рассылке: {e}")
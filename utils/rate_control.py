@@ -0,0 +1,267 @@
+import asyncio
+import functools
+import logging
+import re
+import threading
+import time
+from config import (BROADCAST_GLOBAL_RATE, BROADCAST_PER_CHAT_RATE, RATE_MAX_RETRIES, RATE_MIN,
+                    RATE_DECREASE_FACTOR, RATE_RECOVERY_STEP, OUTBOUND_RESERVED_SHARE)
+from utils.metrics import OUTBOUND_REQUESTS, OUTBOUND_WAIT, OUTBOUND_WAITING
+
+logger = logging.getLogger(__name__)
+
+# Полосы исходящих запросов по убыванию приоритета:
+# ответы и правки сообщений, посты в группу, массовые рассылки
+LANES = ('interactive', 'group', 'bulk')
+INTERACTIVE, GROUP, BULK = LANES
+
+# Полоса запроса, который выполняется внутри call() в этом потоке
+_dispatched = threading.local()
+
+
+def get_retry_after(error):
+    """
+    Значение retry_after из ответа 429 Too Many Requests (в секундах).
+    Для остальных ошибок возвращает None.
+    """
+    if getattr(error, 'error_code', None) != 429:
+        return None
+
+    result_json = getattr(error, 'result_json', None) or {}
+    retry_after = (result_json.get('parameters') or {}).get('retry_after')
+    if retry_after is None:
+        match = re.search(r'retry after (\d+)', str(error), re.IGNORECASE)
+        retry_after = int(match.group(1)) if match else 1
+    return float(retry_after)
+
+
+class RateController:
+    """
+    Общий контроллер исходящих запросов к Bot API.
+    Держит глобальный лимит и лимит на чат, а при 429 ставит на паузу
+    затронутую полосу, снижает скорость и повторяет отложенную отправку.
+    Скорость постепенно возвращается к базовой, пока ошибок нет.
+
+    Запросы идут по полосам LANES. У каждой полосы свой token bucket, и запрос
+    списывает токен в своей полосе и во всех менее приоритетных, поэтому ответ
+    админу не ждет очередь рассылки, а пост в группу — очередь подписчикам.
+    Рассылкам доступна скорость без reserved_share, остаток всегда свободен
+    для ответов и постов в группу.
+    """
+
+    # Порог, после которого из словарей вычищаются неактуальные чаты
+    PRUNE_THRESHOLD = 10000
+
+    def __init__(self, global_rate=BROADCAST_GLOBAL_RATE, per_chat_rate=BROADCAST_PER_CHAT_RATE,
+                 max_retries=RATE_MAX_RETRIES, min_rate=RATE_MIN,
+                 decrease_factor=RATE_DECREASE_FACTOR, recovery_step=RATE_RECOVERY_STEP,
+                 reserved_share=OUTBOUND_RESERVED_SHARE):
+        self.base_rate = float(global_rate)
+        self.rate = self.base_rate
+        self.rate_floor = float(min_rate)
+        self.min_rate = min(self.rate_floor, self.base_rate)
+        self.decrease_factor = decrease_factor
+        self.recovery_step = recovery_step
+        self.max_retries = max_retries
+        self.chat_interval = 1.0 / float(per_chat_rate)
+        self.reserved_share = reserved_share
+
+        # Token bucket каждой полосы; токены могут уходить в минус — это очередь ожидания
+        self.capacity = max(1.0, self.base_rate)
+        self.tokens = {lane: self.capacity for lane in LANES}
+        self.updated_at = time.monotonic()
+
+        self.chat_next_allowed = {}
+        self.chat_paused_until = {}
+        self.paused_until = 0.0
+        self.recovered_at = time.monotonic()
+
+        self.throttled_total = 0
+        self.retries_total = 0
+        self.last_retry_after = 0.0
+        self.sent = {lane: 0 for lane in LANES}
+        self.waiting = {lane: 0 for lane in LANES}
+        self.lock = threading.Lock()
+
+    def set_base_rate(self, rate):
+        """Новая базовая скорость; текущая (сниженная после 429) меняется пропорционально"""
+        with self.lock:
+            rate = float(rate)
+            self.rate = self.rate * rate / self.base_rate
+            self.base_rate = rate
+            self.min_rate = min(self.rate_floor, rate)
+            self.capacity = max(1.0, rate)
+
+    def lane_rate(self, lane):
+        """Скорость полосы: рассылкам не достается зарезервированная доля"""
+        if lane == BULK:
+            return self.rate * (1.0 - self.reserved_share)
+        return self.rate
+
+    def reserve(self, chat_id, lane=BULK):
+        """Резервирует слот для отправки в чат и возвращает, сколько секунд ждать"""
+        with self.lock:
+            now = time.monotonic()
+            if now > self.updated_at:
+                elapsed = now - self.updated_at
+                for name in LANES:
+                    self.tokens[name] = min(self.capacity, self.tokens[name] + elapsed * self.lane_rate(name))
+                self.updated_at = now
+            for name in LANES[LANES.index(lane):]:
+                self.tokens[name] -= 1
+            global_delay = max(0.0, self.updated_at - now) + max(0.0, -self.tokens[lane]) / self.lane_rate(lane)
+
+            start = max(now, self.chat_paused_until.get(chat_id, now))
+            chat_slot = max(start, self.chat_next_allowed.get(chat_id, start))
+            self.chat_next_allowed[chat_id] = chat_slot + self.chat_interval
+
+            if len(self.chat_next_allowed) > self.PRUNE_THRESHOLD:
+                self.chat_next_allowed = {
+                    key: value for key, value in self.chat_next_allowed.items() if value > now
+                }
+                self.chat_paused_until = {
+                    key: value for key, value in self.chat_paused_until.items() if value > now
+                }
+
+            return max(global_delay, chat_slot - now)
+
+    def on_success(self):
+        """Плавное восстановление скорости после успешной отправки"""
+        if self.rate >= self.base_rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return
+            self.rate = min(self.base_rate, self.rate + (now - self.recovered_at) * self.recovery_step)
+            self.recovered_at = now
+
+    def on_throttled(self, chat_id, retry_after):
+        """Реакция на 429: пауза полосы и снижение скорости"""
+        with self.lock:
+            now = time.monotonic()
+            resume_at = now + retry_after
+            self.throttled_total += 1
+            self.last_retry_after = retry_after
+            self.chat_paused_until[chat_id] = max(self.chat_paused_until.get(chat_id, 0.0), resume_at)
+
+            # В личных чатах мы уже держим 1 сообщение/с, значит упёрлись в общий лимит бота.
+            # В группах лимит свой, там останавливаем только этот чат.
+            if not str(chat_id).startswith('-'):
+                # Несколько 429 из одной пачки запросов снижают скорость один раз
+                if now >= self.paused_until:
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.paused_until = max(self.paused_until, resume_at)
+                for name in LANES:
+                    self.tokens[name] = min(self.tokens[name], 0.0)
+                self.updated_at = max(self.updated_at, self.paused_until)
+                self.recovered_at = self.paused_until
+
+        logger.warning(f"⏸️ 429 для {chat_id}: пауза {retry_after:.0f} с, скорость {self.rate:.1f} сообщ/с")
+
+    def call(self, chat_id, func, lane=BULK):
+        """Вызов func() в полосе lane с ожиданием лимитов и повтором после 429"""
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            delay = self.reserve(chat_id, lane)
+            if delay > 0:
+                self._waiting(lane, 1)
+                try:
+                    time.sleep(delay)
+                finally:
+                    self._waiting(lane, -1)
+                waited += delay
+            previous, _dispatched.lane = getattr(_dispatched, 'lane', None), lane
+            try:
+                result = func()
+            except Exception as e:
+                if not self._should_retry(chat_id, lane, e, attempt, waited):
+                    raise
+                continue
+            finally:
+                _dispatched.lane = previous
+            self._done(lane, waited)
+            return result
+
+    async def call_async(self, chat_id, coro_factory, lane=BULK):
+        """Асинхронный вариант call(): coro_factory() создает новую корутину на каждую попытку"""
+        waited = 0.0
+        for attempt in range(self.max_retries + 1):
+            delay = self.reserve(chat_id, lane)
+            if delay > 0:
+                self._waiting(lane, 1)
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self._waiting(lane, -1)
+                waited += delay
+            try:
+                result = await coro_factory()
+            except Exception as e:
+                if not self._should_retry(chat_id, lane, e, attempt, waited):
+                    raise
+                continue
+            self._done(lane, waited)
+            return result
+
+    def _waiting(self, lane, delta):
+        with self.lock:
+            self.waiting[lane] += delta
+        OUTBOUND_WAITING.inc(lane, amount=delta)
+
+    def _should_retry(self, chat_id, lane, error, attempt, waited):
+        retry_after = get_retry_after(error)
+        if retry_after is None or attempt == self.max_retries:
+            OUTBOUND_REQUESTS.inc(lane, 'failed')
+            OUTBOUND_WAIT.observe(waited, lane)
+            return False
+        OUTBOUND_REQUESTS.inc(lane, 'throttled')
+        self.on_throttled(chat_id, retry_after)
+        with self.lock:
+            self.retries_total += 1
+        return True
+
+    def _done(self, lane, waited):
+        self.on_success()
+        with self.lock:
+            self.sent[lane] += 1
+        OUTBOUND_REQUESTS.inc(lane, 'sent')
+        OUTBOUND_WAIT.observe(waited, lane)
+
+    def route_bot_api(self, lane=INTERACTIVE):
+        """
+        Пропуск через контроллер запросов TeleBot к чатам, сделанных в обход call():
+        ответов обработчиков, правок сообщений, отчетов о рассылке — в полосе lane.
+        Запросы, уже выполняемые внутри call(), проходят без повторного ожидания.
+        """
+        from telebot import apihelper
+
+        make_request = apihelper._make_request
+        if getattr(make_request, 'rate_controlled', False):
+            return
+
+        @functools.wraps(make_request)
+        def controlled_make_request(token, method_name, method='get', params=None, files=None):
+            chat_id = (params or {}).get('chat_id')
+            if chat_id is None or getattr(_dispatched, 'lane', None) is not None:
+                return make_request(token, method_name, method, params, files)
+            return self.call(chat_id, lambda: make_request(token, method_name, method, params, files), lane)
+
+        controlled_make_request.rate_controlled = True
+        apihelper._make_request = controlled_make_request
+
+    def snapshot(self):
+        """Текущее состояние контроллера для мониторинга"""
+        with self.lock:
+            now = time.monotonic()
+            return {
+                'rate': self.rate,
+                'base_rate': self.base_rate,
+                'paused_for': max(0.0, self.paused_until - now),
+                'paused_chats': sum(1 for value in self.chat_paused_until.values() if value > now),
+                'queued': sum(self.waiting.values()),
+                'lanes': {lane: {'sent': self.sent[lane], 'waiting': self.waiting[lane]} for lane in LANES},
+                'throttled_total': self.throttled_total,
+                'retries_total': self.retries_total,
+                'last_retry_after': self.last_retry_after,
+            }
@@ -1,88 +1,224 @@
 import logging
+import threading
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.date import DateTrigger
-from config import GROUP_CHAT_ID
+from config import GROUP_CHAT_ID, DELIVERY_MODE, BROADCAST_PROCESSES, OUTBOUND_RESERVED_SHARE
+from utils.broadcast import BroadcastEngine, BroadcastRun
+from utils.catchup import CatchUpExecutor
+from utils.job_store import SQLiteJobStore
+from utils.media_cache import MediaCache
+from utils.metrics import BROADCAST_MESSAGES
+from utils.profiling import profiler
+from utils.progress import BroadcastProgress
+from utils.rate_control import RateController, GROUP
 
 logger = logging.getLogger(__name__)
 
+# Сколько получателей пробовать для первой загрузки изображения
+MEDIA_UPLOAD_ATTEMPTS = 3
+
+JOB_IDS = {'group': 'group_post_{}', 'mailing': 'mailing_{}'}
+
+
+def run_post_job(kind, post_id, parse_mode=None, progress_message=None):
+    """Точка входа задач планировщика: ссылка на функцию сохраняется в БД вместо замыкания"""
+    SchedulerManager.active.send_post(kind, post_id, parse_mode, progress_message)
+
 
 class SchedulerManager:
+    # Экземпляр, которому run_post_job передает сработавшие задачи
+    active = None
+
     def __init__(self, bot, db):
         self.bot = bot
         self.db = db
-        self.scheduler = BackgroundScheduler()
-        self.scheduler.start()
+        self.media_cache = MediaCache(db)
+        self.rate_controller = RateController()
+        # Остановка бота прерывает идущие рассылки, журнал доставки продолжит их после запуска
+        self.stopping = threading.Event()
+        # Идущие многопроцессные рассылки и базовая скорость до их начала
+        self.sharded_runs = 0
+        self.full_rate = None
+        self.sharded_lock = threading.Lock()
+        if DELIVERY_MODE == 'async':
+            from utils.async_delivery import AsyncBroadcastEngine
+            self.broadcast_engine = AsyncBroadcastEngine(self.rate_controller, stop_event=self.stopping)
+        else:
+            self.broadcast_engine = BroadcastEngine(bot, self.rate_controller, stop_event=self.stopping)
+        self.scheduler = BackgroundScheduler(
+            jobstores={'default': SQLiteJobStore(db)},
+            job_defaults={'coalesce': True, 'misfire_grace_time': None}
+        )
+        # Задачи начнут выполняться после restore_scheduled_posts, чтобы просроченный
+        # пост не ушел одновременно из восстановления и из планировщика
+        self.scheduler.start(paused=True)
+        self.catchup = CatchUpExecutor(self)
+        SchedulerManager.active = self
 
     def send_to_group(self, message_text, image_url=None, parse_mode=None):
         """Отправка сообщения в группу"""
         try:
-            if image_url:
-                result = self.bot.send_photo(
-                    chat_id=GROUP_CHAT_ID,
-                    photo=image_url,
-                    caption=message_text,
-                    parse_mode=parse_mode
-                )
-            else:
-                result = self.bot.send_message(
-                    chat_id=GROUP_CHAT_ID,
-                    text=message_text,
-                    parse_mode=parse_mode
-                )
+            photo, content_hash = self.media_cache.resolve(image_url)
+            message = self.broadcast_engine.send(GROUP_CHAT_ID, message_text, photo, parse_mode, GROUP)
+            if isinstance(photo, bytes):
+                self.media_cache.remember(image_url, content_hash, message)
             return True
         except Exception as e:
             logger.error(f"❌ Ошибка отправки: {e}")
             return False
 
-    def send_broadcast(self, message_text, image_url=None, parse_mode="HTML"):
-        """Отправка рассылки подписчикам"""
-        subscribers = self.db.get_all_subscribers()
-        success_count = 0
-        fail_count = 0
+    @profiler.profiled('broadcast', sample=True)
+    def send_broadcast(self, message_text, image_url=None, parse_mode="HTML", mailing_id=None, progress=None):
+        """
+        Отправка рассылки подписчикам.
+        С mailing_id каждая доставка пишется в журнал, и повторный запуск
+        пропускает получателей, которым сообщение уже доставлено.
+        progress — BroadcastProgress для живого отчета админу.
+        """
+        # Подписчики читаются постранично по мере отправки
+        subscribers = self.db.iter_subscribers(mailing_id=mailing_id)
+        run = BroadcastRun(self.db, mailing_id)
+        total = self.db.get_subscribers_count() - (self.db.count_deliveries(mailing_id) if mailing_id is not None else 0)
+        run.expect(total)
 
-        logger.info(f"📧 Начинаю рассылку для {len(subscribers)} подписчиков")
+        logger.info("📧 Начинаю рассылку подписчикам")
 
-        for user_id in subscribers:
-            try:
-                if image_url:
-                    self.bot.send_photo(
-                        chat_id=user_id,
-                        photo=image_url,
-                        caption=message_text,
-                        parse_mode=parse_mode
-                    )
+        if progress is not None:
+            progress.start(run, total)
+        try:
+            photo, content_hash = self.media_cache.resolve(image_url)
+            if isinstance(photo, bytes):
+                if BROADCAST_PROCESSES > 1 and mailing_id is None:
+                    # Без журнала шарды не узнают, кому уже ушла первая загрузка
+                    photo = image_url
                 else:
-                    self.bot.send_message(
-                        chat_id=user_id,
-                        text=message_text,
-                        parse_mode=parse_mode
+                    photo = self._upload_photo(subscribers, image_url, content_hash, photo,
+                                               message_text, parse_mode, run)
+
+            if BROADCAST_PROCESSES > 1:
+                from utils.sharding import ShardCoordinator
+                run.flush()
+                self._limit_to_reserved_share()
+                try:
+                    success_count, fail_count = ShardCoordinator(self.db).run(
+                        message_text, photo, parse_mode, mailing_id
                     )
-                success_count += 1
+                finally:
+                    self._restore_full_rate()
+                run.success_count += success_count
+                run.fail_count += fail_count
+                BROADCAST_MESSAGES.inc('sent', amount=success_count)
+                BROADCAST_MESSAGES.inc('failed', amount=fail_count)
+            else:
+                self.broadcast_engine.broadcast(
+                    subscribers, message_text, photo, parse_mode, run.on_success, run.on_failure
+                )
+        finally:
+            run.flush()
+            run.finish()
+            if progress is not None:
+                progress.finish(interrupted=self.stopping.is_set())
+
+        logger.info(f"📊 Рассылка завершена: {run.success_count} успешно, {run.fail_count} неудачно")
+        return run.success_count, run.fail_count
 
+    def _limit_to_reserved_share(self):
+        """
+        Пока шарды рассылают воркеры, этому процессу (ответы и посты в группу)
+        остается только OUTBOUND_RESERVED_SHARE общего лимита
+        """
+        with self.sharded_lock:
+            self.sharded_runs += 1
+            if self.sharded_runs == 1:
+                self.full_rate = self.rate_controller.base_rate
+                reserved = max(self.rate_controller.rate_floor, self.full_rate * OUTBOUND_RESERVED_SHARE)
+                self.rate_controller.set_base_rate(min(self.full_rate, reserved))
+
+    def _restore_full_rate(self):
+        with self.sharded_lock:
+            self.sharded_runs -= 1
+            if self.sharded_runs == 0:
+                self.rate_controller.set_base_rate(self.full_rate)
+
+    def _upload_photo(self, recipients, image_url, content_hash, data, message_text, parse_mode, run):
+        """
+        Загрузка изображения первому получателю, чтобы остальным отправлять file_id.
+        Возвращает photo для остальной рассылки.
+        """
+        for _, user_id in zip(range(MEDIA_UPLOAD_ATTEMPTS), recipients):
+            try:
+                message = self.broadcast_engine.send(user_id, message_text, data, parse_mode)
             except Exception as e:
                 logger.error(f"❌ Ошибка отправки пользователю {user_id}: {e}")
-                fail_count += 1
+                run.on_failure(user_id, e)
+                continue
 
+            run.on_success(user_id)
+            file_id = self.media_cache.remember(image_url, content_hash, message)
+            return file_id or image_url
 
-                if "bot was blocked" in str(e).lower():
-                    self.remove_subscriber(user_id)
+        # Загрузить не удалось — остальным отправляем исходную ссылку
+        return image_url
 
-        logger.info(f"📊 Рассылка завершена: {success_count} успешно, {fail_count} неудачно")
-        return success_count, fail_count
+    def schedule_group_post(self, post_id, message_text, image_url, scheduled_time, parse_mode="HTML"):
+        """Планирование поста в группу (текст и изображение читаются из БД при отправке)"""
+        self._add_post_job('group', post_id, scheduled_time, parse_mode)
 
-    def remove_subscriber(self, user_id):
-        """Удаление подписчика"""
-        conn = self.db.conn
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM subscribers WHERE user_id = ?', (user_id,))
-        conn.commit()
-        logger.info(f"🗑️ Удален подписчик: {user_id}")
+    def schedule_mailing_post(self, post_id, message_text, image_url, scheduled_time, parse_mode="HTML"):
+        """Планирование рассылки (текст и изображение читаются из БД при отправке)"""
+        self._add_post_job('mailing', post_id, scheduled_time, parse_mode)
 
-    def schedule_group_post(self, post_id, message_text, image_url, scheduled_time, parse_mode="HTML"):
-        """Планирование поста в группу"""
+    def _add_post_job(self, kind, post_id, scheduled_time, parse_mode=None):
+        """В хранилище задач попадают только тип и ID поста"""
+        self.scheduler.add_job(
+            run_post_job,
+            trigger=DateTrigger(run_date=scheduled_time),
+            args=(kind, post_id),
+            kwargs={'parse_mode': parse_mode},
+            id=JOB_IDS[kind].format(post_id),
+            replace_existing=True
+        )
 
-        def send_scheduled():
+    def send_mailing_now(self, post_id, parse_mode, chat_id, message_id):
+        """
+        Немедленная рассылка в фоне через планировщик.
+        Ход рассылки показывается правкой сообщения message_id в чате chat_id.
+        """
+        self.scheduler.add_job(
+            run_post_job,
+            args=('mailing', post_id),
+            kwargs={'parse_mode': parse_mode, 'progress_message': (chat_id, message_id)},
+            id=JOB_IDS['mailing'].format(post_id),
+            replace_existing=True
+        )
+
+    def send_post(self, kind, post_id, parse_mode=None, progress_message=None):
+        """
+        Отправка запланированного поста, загруженного из БД.
+        Возвращает успех отправки или None, если пост уже отправлен или удален
+        либо рассылка прервана остановкой бота.
+        parse_mode — режим разметки задачи; без него используется сохраненный в посте.
+        progress_message — (chat_id, message_id) для живого отчета о рассылке.
+        """
+        return profiler.run(f'{kind}-post-{post_id}', self._send_post, kind, post_id, parse_mode,
+                            progress_message, sample=True)
+
+    def _send_post(self, kind, post_id, parse_mode, progress_message):
+        if kind == 'group':
+            post = self.db.get_group_post(post_id)
+        else:
+            post = self.db.get_mailing_post(post_id)
+
+        if post is None or post[5]:
+            logger.info(f"⏭️ Пост {post_id} ({kind}) уже отправлен или удален")
+            return None
+
+        _, _, message_text, image_url, _, _, post_parse_mode = post
+        if parse_mode is None:
+            # Досылка без задачи (CatchUpExecutor) берет режим разметки из поста
+            parse_mode = post_parse_mode
+        if kind == 'group':
             logger.info(f"📨 Отправка запланированного поста в группу ID: {post_id}")
             success = self.send_to_group(message_text, image_url, parse_mode)
             if success:
@@ -90,59 +226,47 @@ class SchedulerManager:
                 logger.info(f"✅ Пост {post_id} успешно отправлен в группу")
             else:
                 logger.error(f"❌ Ошибка отправки поста {post_id} в группу")
-
-        self.scheduler.add_job(
-            send_scheduled,
-            trigger=DateTrigger(run_date=scheduled_time),
-            id=f'group_post_{post_id}'
-        )
-
-    def schedule_mailing_post(self, post_id, message_text, image_url, scheduled_time, parse_mode="HTML"):
-        """Планирование рассылки"""
-
-        def send_scheduled():
+            return success
+        else:
             logger.info(f"📨 Отправка запланированной рассылки ID: {post_id}")
-            success_count, fail_count = self.send_broadcast(message_text, image_url,
-                                                            parse_mode)
+            progress = BroadcastProgress(self.bot, *progress_message, mailing_id=post_id) if progress_message else None
+            success_count, fail_count = self.send_broadcast(message_text, image_url, parse_mode,
+                                                            mailing_id=post_id, progress=progress)
+            if self.stopping.is_set():
+                # Пост остается неотправленным и будет дослан после запуска
+                logger.warning(f"⏸️ Рассылка {post_id} прервана остановкой бота: {success_count} успешно")
+                return None
             self.db.mark_mailing_post_as_sent(post_id)
             logger.info(f"✅ Рассылка {post_id} отправлена: {success_count} успешно")
-
-        self.scheduler.add_job(
-            send_scheduled,
-            trigger=DateTrigger(run_date=scheduled_time),
-            id=f'mailing_{post_id}'
-        )
+            return True
 
     def restore_scheduled_posts(self):
-        """Восстановление отложенных постов при запуске"""
-        now = datetime.now()
-
-
-        group_posts = self.db.get_pending_group_posts()
-        for post_id, author, message_text, image_url, scheduled_time in group_posts:
-            scheduled_dt = datetime.fromisoformat(scheduled_time)
-            if scheduled_dt > now:
-                self.schedule_group_post(post_id, message_text, image_url, scheduled_dt)
-                logger.info(f"🔄 Восстановлен пост в группу ID: {post_id} на {scheduled_dt}")
-            else:
-
-                success = self.send_to_group(message_text, image_url)
-                if success:
-                    self.db.mark_group_post_as_sent(post_id)
-                    logger.info(f"🚀 Просроченный пост {post_id} отправлен в группу")
-
+        """
+        Восстановление отложенных постов при запуске.
+        Будущие посты уже лежат в хранилище задач, здесь обрабатываются только
+        разовый перенос старых постов и просроченные посты без задачи
+        (например, рассылка, прерванная перезапуском). Просроченные посты
+        досылаются в фоне, метод возвращается сразу.
+        """
+        try:
+            backfill = self.db.get_scheduler_backfill()
+            for kind, post_id, scheduled_time in backfill:
+                # До переноса посты планировались с parse_mode="HTML"
+                self._add_post_job(kind, post_id, datetime.fromisoformat(scheduled_time), "HTML")
+            if backfill:
+                self.db.clear_scheduler_backfill()
+                logger.info(f"🔄 В хранилище задач перенесено постов: {len(backfill)}")
 
-        mailing_posts = self.db.get_pending_mailing_posts()
-        for post_id, author, message_text, image_url, scheduled_time in mailing_posts:
-            scheduled_dt = datetime.fromisoformat(scheduled_time)
-            if scheduled_dt > now:
-                self.schedule_mailing_post(post_id, message_text, image_url, scheduled_dt)
-                logger.info(f"🔄 Восстановлена рассылка ID: {post_id} на {scheduled_dt}")
-            else:
-                success_count, fail_count = self.send_broadcast(message_text, image_url)
-                self.db.mark_mailing_post_as_sent(post_id)
-                logger.info(f"🚀 Просроченная рассылка {post_id} отправлена")
+            overdue = [('group', post[0], post[4]) for post in self.db.get_pending_group_posts()]
+            overdue += [('mailing', post[0], post[4]) for post in self.db.get_pending_mailing_posts()]
+            self.catchup.submit(overdue)
+        finally:
+            # Задачи, время которых прошло, пока бот был выключен, запустятся сразу
+            self.scheduler.resume()
 
     def shutdown(self):
-        """Остановка планировщика"""
-        self.scheduler.shutdown()
\ No newline at end of file
+        """Остановка планировщика; идущие рассылки прерываются после уже начатых отправок"""
+        self.stopping.set()
+        self.scheduler.shutdown()
+        self.catchup.shutdown()
+        self.broadcast_engine.shutdown()
\ No newline at end of file
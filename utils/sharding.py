@@ -0,0 +1,202 @@
+"""
+Многопроцессная рассылка по шардам.
+
+Координатор делит подписчиков на диапазоны user_id и кладет их в очередь
+(таблицы broadcast_jobs/broadcast_shards в той же SQLite-базе). Воркеры —
+процессы на той же машине — захватывают шарды и рассылают их. Общий лимит
+скорости делится поровну между воркерами, которые сейчас рассылают шарды.
+
+Воркеры на других хостах не поддерживаются: общий индекс WAL работает только
+в пределах одного хоста, а блокировки SQLite на сетевых дисках ненадежны.
+
+Запуск дополнительного воркера на той же машине:
+    python -m utils.sharding --db /path/to/bot.db [--job ID] [--follow]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from config import (BOT_TOKEN, DB_PATH, BROADCAST_GLOBAL_RATE, BROADCAST_PROCESSES, BROADCAST_SHARDS,
+                    SHARD_STALE_TIMEOUT, SHARD_HEARTBEAT_INTERVAL, DELIVERY_MODE, OUTBOUND_RESERVED_SHARE)
+
+logger = logging.getLogger(__name__)
+
+
+class ShardCoordinator:
+    """Разбиение рассылки на шарды, запуск локальных воркеров и сбор итогового отчета"""
+
+    def __init__(self, db, processes=BROADCAST_PROCESSES, shards=BROADCAST_SHARDS,
+                 rate=BROADCAST_GLOBAL_RATE):
+        self.db = db
+        self.processes = processes
+        self.shards = shards or processes * 4
+        self.rate = rate
+
+    def run(self, message_text, image_url=None, parse_mode=None, mailing_id=None):
+        """Рассылка через пул процессов. Возвращает (успешно, неудачно)"""
+        boundaries = self.db.get_subscriber_boundaries(self.shards)
+        lows = [None] + boundaries
+        highs = [boundary - 1 for boundary in boundaries] + [None]
+        job_id = self.db.create_broadcast_job(
+            mailing_id, message_text, image_url, parse_mode, self.rate, self.processes,
+            list(zip(lows, highs))
+        )
+        logger.info(f"🧩 Рассылка {job_id}: {len(lows)} шардов, {self.processes} процессов")
+
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(target=run_worker, args=(self.db.db_path, job_id), name=f'shard-worker-{number}')
+            for number in range(self.processes)
+        ]
+        for process in workers:
+            process.start()
+
+        while True:
+            shards = self.db.get_broadcast_shards(job_id)
+            if all(shard[3] == 'done' for shard in shards):
+                break
+            if not any(process.is_alive() for process in workers):
+                # Локальные воркеры завершились, а шарды остались (например, процесс упал):
+                # дорабатываем в текущем процессе. Шард, который еще рассылает внешний воркер,
+                # захватывается, только когда его heartbeat старше SHARD_STALE_TIMEOUT
+                if ShardWorker(self.db, job_id=job_id).run():
+                    logger.warning(f"⚠️ Рассылка {job_id}: оставшиеся шарды доработаны в основном процессе")
+                    continue
+            time.sleep(1)
+
+        for process in workers:
+            process.join()
+        self.db.finish_broadcast_job(job_id)
+        return self.report(job_id)
+
+    def report(self, job_id):
+        """Сводка по шардам задания"""
+        shards = self.db.get_broadcast_shards(job_id)
+        success_count = sum(shard[5] for shard in shards)
+        fail_count = sum(shard[6] for shard in shards)
+        for shard_no, low, high, status, worker, sent, failed in shards:
+            logger.info(f"🧩 Шард {shard_no} [{low}..{high}] ({worker}): {sent} успешно, {failed} неудачно")
+        logger.info(f"📊 Рассылка {job_id} по {len(shards)} шардам: {success_count} успешно, {fail_count} неудачно")
+        return success_count, fail_count
+
+
+class ShardWorker:
+    """Воркер: захватывает шарды из очереди и рассылает их со своей долей лимита"""
+
+    def __init__(self, db, job_id=None, name=None, stale_seconds=SHARD_STALE_TIMEOUT):
+        self.db = db
+        self.job_id = job_id
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stale_seconds = stale_seconds
+        self.engines = {}
+
+    def _share(self, job):
+        """
+        Доля общего лимита задания: он делится между всеми живыми воркерами.
+        Пока запущенные координатором процессы не успели захватить шарды,
+        делим хотя бы на их число. OUTBOUND_RESERVED_SHARE лимита остается
+        основному процессу для ответов и постов в группу.
+        """
+        rate, workers = job[5], job[6]
+        rate *= 1.0 - OUTBOUND_RESERVED_SHARE
+        return rate / max(1, workers, self.db.count_broadcast_workers(self.stale_seconds))
+
+    def _engine(self, job):
+        """Движок рассылки с долей общего лимита для задания"""
+        job_id = job[0]
+        if job_id not in self.engines:
+            from utils.rate_control import RateController
+            # Резерв уже вычтен из доли, внутри воркера вся она достается рассылке
+            rate_controller = RateController(global_rate=self._share(job), reserved_share=0.0)
+            if DELIVERY_MODE == 'async':
+                from utils.async_delivery import AsyncBroadcastEngine
+                engine = AsyncBroadcastEngine(rate_controller)
+            else:
+                import telebot
+                from utils.broadcast import BroadcastEngine
+                engine = BroadcastEngine(telebot.TeleBot(BOT_TOKEN), rate_controller)
+            self.engines[job_id] = engine
+        return self.engines[job_id]
+
+    def run(self, follow=False):
+        """Обработка шардов, пока они есть (с follow — ожидание новых заданий)"""
+        processed = 0
+        try:
+            while True:
+                claimed = self.db.claim_broadcast_shard(self.name, self.job_id, self.stale_seconds)
+                if claimed is None:
+                    if not follow:
+                        return processed
+                    time.sleep(SHARD_HEARTBEAT_INTERVAL)
+                    continue
+                self.process(*claimed)
+                processed += 1
+        finally:
+            for engine in self.engines.values():
+                engine.shutdown()
+
+    def process(self, job_id, shard_no, min_user_id, max_user_id):
+        from utils.broadcast import BroadcastRun
+
+        job = self.db.get_broadcast_job(job_id)
+        mailing_id, message_text, image_url, parse_mode = job[1], job[2], job[3], job[4]
+        engine = self._engine(job)
+        engine.rate_controller.set_base_rate(self._share(job))
+        # Итоги шардов попадают в метрики через отчет координатора
+        run = BroadcastRun(self.db, mailing_id, track_metrics=False)
+        logger.info(f"🧩 {self.name}: шард {shard_no} задания {job_id} [{min_user_id}..{max_user_id}]")
+
+        # Heartbeat с промежуточными счетчиками, чтобы шард не посчитали брошенным;
+        # заодно доля лимита пересчитывается, если воркеры подключились или ушли
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(SHARD_HEARTBEAT_INTERVAL):
+                self.db.update_broadcast_shard(job_id, shard_no, run.success_count, run.fail_count)
+                engine.rate_controller.set_base_rate(self._share(job))
+
+        heartbeat_thread = threading.Thread(target=heartbeat, name='shard-heartbeat', daemon=True)
+        heartbeat_thread.start()
+        try:
+            recipients = self.db.iter_subscribers(
+                mailing_id=mailing_id, min_user_id=min_user_id, max_user_id=max_user_id
+            )
+            engine.broadcast(recipients, message_text, image_url, parse_mode, run.on_success, run.on_failure)
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+            run.flush()
+
+        self.db.update_broadcast_shard(job_id, shard_no, run.success_count, run.fail_count, status='done')
+
+
+def run_worker(db_path, job_id=None, follow=False):
+    """Точка входа процесса-воркера"""
+    from database import Database
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    db = Database(db_path)
+    try:
+        processed = ShardWorker(db, job_id=job_id).run(follow=follow)
+        logger.info(f"✅ Воркер завершен, обработано шардов: {processed}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воркер многопроцессной рассылки')
+    parser.add_argument('--db', default=DB_PATH, help='путь к файлу базы данных')
+    parser.add_argument('--job', type=int, default=None, help='обрабатывать только это задание')
+    parser.add_argument('--follow', action='store_true', help='ждать новые задания после опустошения очереди')
+    args = parser.parse_args()
+    run_worker(args.db, args.job, args.follow)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import logging
+import threading
+from config import SUBSCRIBER_FLUSH_SIZE, SUBSCRIBER_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberWriteBuffer:
+    """
+    Отложенная пакетная запись подписчиков.
+    /start только кладет пользователя в буфер, а фоновый поток
+    сбрасывает его в БД одной транзакцией по размеру или по таймеру.
+    """
+
+    def __init__(self, db, batch_size=SUBSCRIBER_FLUSH_SIZE, flush_interval=SUBSCRIBER_FLUSH_INTERVAL):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # user_id -> строка; повторный /start того же пользователя перезаписывает запись
+        self.pending = {}
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='subscriber-writer', daemon=True)
+        self.thread.start()
+
+    def add(self, user_id, username, first_name, last_name):
+        """Постановка подписчика в очередь на запись"""
+        row = (user_id, username, first_name, last_name)
+        with self.condition:
+            if not self.closed:
+                self.pending[user_id] = row
+                if len(self.pending) >= self.batch_size:
+                    self.condition.notify()
+                return
+        # После остановки буфера пишем сразу
+        self.db.add_subscribers([row])
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.closed and len(self.pending) < self.batch_size:
+                    self.condition.wait(timeout=self.flush_interval)
+                batch, self.pending = self.pending, {}
+                stop = self.closed
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.db.add_subscribers(list(batch.values()))
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи {len(batch)} подписчиков: {e}")
+            with self.condition:
+                # Возвращаем в буфер, не затирая более свежие данные
+                for user_id, row in batch.items():
+                    self.pending.setdefault(user_id, row)
+
+    def close(self):
+        """Остановка с финальным сбросом буфера"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        # Если последний сброс не удался, пробуем еще раз напрямую
+        with self.condition:
+            batch, self.pending = self.pending, {}
+        if batch:
+            self.db.add_subscribers(list(batch.values()))
+        logger.info("💾 Буфер подписчиков сброшен")
@@ -0,0 +1,139 @@
+import hmac
+import logging
+import ssl
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import types
+from config import (WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_MAX_CONNECTIONS,
+                    WEBHOOK_SSL_CERT, WEBHOOK_SSL_KEY)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Telegram не присылает обновления больше нескольких сотен КБ
+MAX_UPDATE_BYTES = 1024 * 1024
+
+
+class WebhookServer:
+    """
+    Прием обновлений через webhook.
+    HTTP-сервер проверяет секретный токен, сразу отвечает Telegram и передает
+    обновление в ограниченный пул воркеров, который вызывает bot.process_new_updates.
+    Если очередь заполнена, сервер отвечает 503 и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, bot, url=WEBHOOK_URL, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 secret_token=WEBHOOK_SECRET, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE):
+        self.bot = bot
+        self.url = url
+        self.path = path
+        self.secret_token = secret_token
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+        self.serving = False
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+
+        self.httpd = ThreadingHTTPServer((listen, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        if WEBHOOK_SSL_CERT and WEBHOOK_SSL_KEY:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(WEBHOOK_SSL_CERT, WEBHOOK_SSL_KEY)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive: Telegram держит до max_connections постоянных соединений
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length <= 0 or length > MAX_UPDATE_BYTES:
+                    self.close_connection = True
+                    return self._reply(400)
+                # Тело читается до проверок, иначе оно испортит следующий запрос в keep-alive соединении
+                body = self.rfile.read(length)
+
+                if self.path != server.path:
+                    return self._reply(404)
+
+                token = self.headers.get(SECRET_HEADER, '')
+                if not hmac.compare_digest(token.encode(), server.secret_token.encode()):
+                    server.rejected += 1
+                    return self._reply(403)
+
+                if not server.submit(body):
+                    return self._reply(503)
+                self._reply(200)
+
+            def do_GET(self):
+                self._reply(405)
+
+            def _reply(self, status):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
+
+    def submit(self, body):
+        """Постановка обновления в пул. Возвращает False, если очередь заполнена"""
+        if not self.slots.acquire(blocking=False):
+            self.dropped += 1
+            logger.warning("⚠️ Очередь webhook заполнена, обновление отклонено")
+            return False
+        self.received += 1
+        self.executor.submit(self._process, body)
+        return True
+
+    def _process(self, body):
+        try:
+            update = types.Update.de_json(body.decode('utf-8'))
+            self.bot.process_new_updates([update])
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки обновления: {e}")
+        finally:
+            self.slots.release()
+
+    def set_webhook(self):
+        """Регистрация webhook в Telegram"""
+        self.bot.set_webhook(
+            url=self.url.rstrip('/') + self.path,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            secret_token=self.secret_token,
+        )
+        logger.info(f"🔗 Webhook установлен: {self.url.rstrip('/')}{self.path}")
+
+    def serve_forever(self):
+        logger.info(f"🌐 Webhook сервер слушает порт {self.port}")
+        self.serving = True
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        thread = threading.Thread(target=self.serve_forever, name='webhook-server', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Остановка сервера и дообработка принятых обновлений"""
+        if self.serving:
+            # shutdown() ждет выхода из serve_forever, без запущенного цикла он зависнет
+            self.httpd.shutdown()
+        self.httpd.server_close()
+        self.executor.shutdown(wait=True)
+        logger.info(f"🌐 Webhook остановлен: принято {self.received}, отклонено {self.rejected + self.dropped}")